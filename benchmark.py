@@ -0,0 +1,174 @@
+# Banc d'essai sans interface : chaque générateur sur une échelle de tailles de
+# plaque, chaque mesure dans un processus neuf pour que le pic de mémoire soit le sien.
+# python benchmark.py -o resultats.json --compare precedent.json --threshold 0.2
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import forkserver, get_all_start_methods, get_context
+from generator import GENERATOR_VERSION, SHAPES, filename_for, generate, parameters_for, save
+
+try:
+    import resource
+except ImportError:
+    # Windows : pas de getrusage, le pic de mémoire n'est pas mesuré
+    resource = None
+
+PLATE_SIZES = [10, 100, 300, 1000]
+
+CELLS = {
+    'hexagon': [{'size': size, 'spacing': 0.25, 'height': 1.0} for size in (1.0, 2.5, 5.0)],
+    'circle': [{'radius': radius, 'spacing': 0.5, 'height': 1.0} for radius in (1.0, 2.5, 5.0)],
+    'square': [{'side_length': side, 'spacing': 0.25, 'height': 1.0} for side in (1.0, 2.5, 5.0)],
+    'triangle': [{'side_length': side, 'spacing': 0.25, 'height': 1.0} for side in (1.0, 2.5, 5.0)],
+    'koch': [{'side_length': side, 'iterations': iterations} for side in (2.0, 5.0) for iterations in (2, 4, 6)]
+}
+
+OPERATIONS = ['mesh', 'save']
+
+# Cas plus gros écartés de l'échelle par défaut : 20 millions de triangles font déjà 1 Go
+# en mémoire pour 'mesh' et autant sur le disque pour 'save' (Koch à 6 itérations sur
+# une plaque d'un mètre en ferait près de 200 millions)
+MAX_TRIANGLES = 20_000_000
+
+# Sous ce temps, les écarts relèvent du bruit de mesure et ne comptent pas comme régressions
+MIN_SECONDS = 0.05
+
+
+def cases(sizes=PLATE_SIZES, shapes=None, max_triangles=MAX_TRIANGLES):
+    for shape, cells in CELLS.items():
+        if shapes and shape not in shapes:
+            continue
+        for plate in sizes:
+            for cell in cells:
+                params = dict(cell, width=float(plate), height_dimension=float(plate))
+                if max_triangles and SHAPES[shape](parameters_for(shape, params)).triangle_count() > max_triangles:
+                    continue
+                for operation in OPERATIONS:
+                    yield f"{operation}/{filename_for(shape, params)[:-len('.stl')]}", shape, params, operation
+
+
+def peak_rss(who=None):
+    # RUSAGE_SELF pour le processus de mesure, RUSAGE_CHILDREN pour le plus gros
+    # des processus de calcul qu'il a lancés (pool de tile_parallel ou des bandes)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # Linux compte en kilo-octets, macOS en octets
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure(shape, params, operation, directory):
+    output_bytes = None
+    start = time.perf_counter()
+    if operation == 'mesh':
+        triangles = len(generate(shape, params).data)
+    else:
+        filename = os.path.join(directory, filename_for(shape, params))
+        triangles = save(shape, params, filename)
+        output_bytes = os.path.getsize(filename)
+        os.remove(filename)
+    seconds = time.perf_counter() - start
+    return {
+        'seconds': seconds,
+        'peak_rss': peak_rss(),
+        'peak_rss_children': peak_rss(resource.RUSAGE_CHILDREN) if resource else None,
+        'triangles': triangles,
+        'triangles_per_second': triangles / seconds if seconds > 0 else None,
+        'output_bytes': output_bytes
+    }
+
+
+def measuring_context():
+    # Linux garde le pic de mémoire (ru_maxrss) d'un processus à travers fork et exec : un
+    # processus de mesure lancé par le banc hériterait du pic du banc, qui grossit avec les
+    # triangle_count de cases(). Les mesures sont donc forkées par un serveur démarré tout
+    # de suite, encore petit. Sans forkserver (Windows), spawn
+    if 'forkserver' not in get_all_start_methods():
+        return get_context('spawn')
+    forkserver.ensure_running()
+    return get_context('forkserver')
+
+
+def run_case(shape, params, operation, directory, repeat=1, context=None):
+    # Meilleur temps sur repeat essais, chacun dans un processus neuf
+    best = None
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context or measuring_context()) as executor:
+            result = executor.submit(measure, shape, params, operation, directory).result()
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+
+def run(sizes=PLATE_SIZES, shapes=None, repeat=1, workers=None, report=print, max_triangles=MAX_TRIANGLES):
+    results = []
+    context = measuring_context()
+    with tempfile.TemporaryDirectory() as directory:
+        for case_id, shape, params, operation in cases(sizes, shapes, max_triangles):
+            if workers:
+                params = dict(params, workers=workers)
+            result = dict(id=case_id, shape=shape, operation=operation, parameters=params,
+                          **run_case(shape, params, operation, directory, repeat, context))
+            if report:
+                report(f"{case_id} : {result['triangles']} triangles en {result['seconds']:.3f} s")
+            results.append(result)
+    return {
+        'generator_version': GENERATOR_VERSION,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results
+    }
+
+
+def regressions(current, previous, threshold):
+    # Cas dont le temps ou le pic de mémoire dépasse l'ancienne valeur de plus de threshold
+    before = {result['id']: result for result in previous['results']}
+    found = []
+    for result in current['results']:
+        old = before.get(result['id'])
+        if old is None:
+            continue
+        for metric in ('seconds', 'peak_rss', 'peak_rss_children'):
+            if metric == 'seconds' and max(result['seconds'], old['seconds']) < MIN_SECONDS:
+                continue
+            if result.get(metric) and old.get(metric) and result[metric] > old[metric] * (1 + threshold):
+                found.append((result['id'], metric, old[metric], result[metric]))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesure les générateurs de formes sur plusieurs tailles de plaque.")
+    parser.add_argument('--output', '-o', default='benchmark.json', help="Fichier JSON des résultats")
+    parser.add_argument('--sizes', type=float, nargs='+', default=PLATE_SIZES, help="Côtés de plaque (mm)")
+    parser.add_argument('--shapes', nargs='+', choices=list(CELLS), help="Formes à mesurer (défaut : toutes)")
+    parser.add_argument('--repeat', type=int, default=1, help="Essais par cas, le meilleur est retenu")
+    parser.add_argument('--workers', type=int, help="Nombre de processus passé aux générateurs")
+    parser.add_argument('--max-triangles', type=int, default=MAX_TRIANGLES,
+                        help="Écarte les cas plus gros (0 : aucune limite)")
+    parser.add_argument('--compare', help="Résultats précédents (JSON) à comparer")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Régression tolérée, 0.2 pour 20 %%")
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.shapes, args.repeat, args.workers, max_triangles=args.max_triangles)
+    with open(args.output, 'w') as fh:
+        json.dump(current, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            previous = json.load(fh)
+        found = regressions(current, previous, args.threshold)
+        for case_id, metric, old, new in found:
+            print(f"Régression {case_id} ({metric}) : {old:.4g} -> {new:.4g}")
+        if found:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
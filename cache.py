@@ -0,0 +1,136 @@
+# Cache des maillages adressé par contenu : la clé est l'empreinte de la forme,
+# de ses paramètres et de la version du générateur. Les triangles sont stockés
+# en .npy (type Mesh.dtype) pour être rechargés en mémoire projetée.
+
+import os
+from collections import OrderedDict
+import numpy as np
+from stl import mesh as stlmesh
+from generator import SHAPES, parameters_for, parameters_hash
+from profiling import stage
+
+DEFAULT_DIRECTORY = os.environ.get(
+    'STL_PATTERN_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'stl-pattern-generator'))
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+class MeshCache:
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES, memory_entries=4):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def get(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            # evict classe les entrées par date de modification : un accès en mémoire compte aussi
+            self.touch(key)
+            return self.memory[key]
+        path = self.path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        # Copie à l'écriture : le fichier n'est jamais modifié par les appelants
+        with stage('cache', hit=True):
+            data = np.load(path, mmap_mode='c')
+        self.touch(key)
+        self.hits += 1
+        self.remember(key, data)
+        return data
+
+    def touch(self, key):
+        try:
+            os.utime(self.path(key))
+        except OSError:
+            # Entrée déjà évincée par un autre processus : la copie projetée reste lisible
+            pass
+
+    def put(self, key, count, bands):
+        # Les bandes sont écrites directement dans le fichier projeté, puis le
+        # fichier temporaire est renommé : une entrée n'est jamais à moitié écrite
+        path = self.path(key)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        data = np.lib.format.open_memmap(temporary, mode='w+', dtype=stlmesh.Mesh.dtype, shape=(count,))
+        try:
+            start = 0
+            for band in bands:
+                data[start:start + len(band)] = band
+                start += len(band)
+            data.flush()
+        except BaseException:
+            # Génération interrompue (annulation comprise) : rien n'entre dans le cache
+            del data
+            os.remove(temporary)
+            raise
+        del data
+        os.replace(temporary, path)
+        self.evict(keep=key)
+        return self.get_stored(key)
+
+    def get_stored(self, key):
+        data = np.load(self.path(key), mmap_mode='c')
+        self.remember(key, data)
+        return data
+
+    def remember(self, key, data):
+        self.memory[key] = data
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def entries(self):
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.npy')]
+        return sorted((os.stat(path).st_mtime, os.stat(path).st_size, path) for path in paths)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        # Supprime les entrées les moins récemment utilisées jusqu'à repasser sous la limite
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            key = os.path.basename(path)[:-len('.npy')]
+            if key == keep:
+                continue
+            self.memory.pop(key, None)
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        self.memory.clear()
+        for _, _, path in self.entries():
+            os.remove(path)
+
+    def fetch(self, shape, params, progress=None):
+        # Triangles de la plaque (tableau Mesh.dtype), générés seulement en cas d'absence
+        key = parameters_hash(shape, params)
+        data = self.get(key)
+        if data is None:
+            pattern = SHAPES[shape](parameters_for(shape, params))
+            data = self.put(key, pattern.triangle_count(), pattern.generate_bands(progress))
+        return data
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries()),
+            'bytes': self.size()
+        }
@@ -0,0 +1,349 @@
+# Découpe du motif par un contour quelconque (rectangle, cercle, polygone lu
+# dans un fichier). Les cellules sont classées en bloc grâce à une grille
+# uniforme : seules celles qui chevauchent le contour sont réellement découpées.
+
+import json
+import math
+import numpy as np
+
+OUTSIDE, INSIDE, BOUNDARY = 0, 1, 2
+# Nombre maximal de cases de la grille sur un axe
+MAX_BINS = 1024
+# Paires (cellule, arête) traitées d'un coup lors du test exact des cellules du bord
+REFINE_PAIRS = 1_000_000
+
+
+def signed_area(polygon):
+    x, y = polygon[:, 0], polygon[:, 1]
+    return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def counterclockwise(polygon):
+    polygon = np.asarray(polygon, dtype=float)
+    return polygon[::-1].copy() if signed_area(polygon) < 0 else polygon
+
+
+def load_outline(filename):
+    # Liste JSON de points [[x, y], ...] ou texte avec un point "x y" ou "x,y" par ligne
+    with open(filename) as fh:
+        text = fh.read()
+    if filename.lower().endswith('.json'):
+        points = json.loads(text)
+    else:
+        points = [[float(value) for value in line.replace(',', ' ').split()[:2]]
+                  for line in text.splitlines() if line.strip() and not line.lstrip().startswith('#')]
+    polygon = np.asarray(points, dtype=float).reshape(-1, 2)
+    if len(polygon) > 1 and np.allclose(polygon[0], polygon[-1]):
+        polygon = polygon[:-1]
+    if len(polygon) < 3:
+        raise ValueError(f"Contour invalide dans {filename} : au moins trois points attendus")
+    return counterclockwise(polygon)
+
+
+class BinGrid:
+    # Grille uniforme sur la boîte englobante du contour : chaque case est
+    # dehors, dedans, ou traversée par le contour
+    def __init__(self, outline, cell_radius):
+        self.outline = outline
+        low, high = outline.min(axis=0), outline.max(axis=0)
+        extent = float(max(high - low))
+        self.size = max(2 * cell_radius, extent / MAX_BINS, 1e-9)
+        self.origin = low - self.size
+        self.shape = (np.ceil((high - self.origin) / self.size).astype(int) + 2)
+        self.states = self.classify_bins()
+
+    def classify_bins(self):
+        num_x, num_y = self.shape
+        states = np.zeros((num_y, num_x), dtype=np.uint8)
+
+        # Dedans / dehors par balayage : croisements de chaque ligne centrale avec les arêtes
+        starts, ends = self.outline, np.roll(self.outline, -1, axis=0)
+        centers_y = self.origin[1] + (np.arange(num_y) + 0.5) * self.size
+        centers_x = self.origin[0] + (np.arange(num_x) + 0.5) * self.size
+        for row, y in enumerate(centers_y):
+            crosses = (starts[:, 1] > y) != (ends[:, 1] > y)
+            if not crosses.any():
+                continue
+            a, b = starts[crosses], ends[crosses]
+            xs = np.sort(a[:, 0] + (y - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1]))
+            states[row] = np.searchsorted(xs, centers_x) % 2
+
+        # Cases traversées : points échantillonnés le long des arêtes, puis dilatation
+        # d'une case pour ne manquer aucun coin effleuré
+        lengths = np.linalg.norm(ends - starts, axis=1)
+        steps = np.maximum(1, np.ceil(2 * lengths / self.size).astype(int))
+        edge = np.repeat(np.arange(len(starts)), steps + 1)
+        fraction = np.concatenate([np.linspace(0, 1, count + 1) for count in steps])
+        points = starts[edge] + (ends[edge] - starts[edge]) * fraction[:, None]
+        cells = np.floor((points - self.origin) / self.size).astype(int)
+        crossed = np.zeros_like(states, dtype=bool)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                x = np.clip(cells[:, 0] + dx, 0, num_x - 1)
+                y = np.clip(cells[:, 1] + dy, 0, num_y - 1)
+                crossed[y, x] = True
+        states[crossed] = BOUNDARY
+        return states
+
+    def classify(self, centers, radius):
+        # État de chaque cellule d'après les cases que couvre son cercle englobant
+        num_x, num_y = self.shape
+        low = np.floor((centers - radius - self.origin) / self.size).astype(int)
+        high = np.floor((centers + radius - self.origin) / self.size).astype(int)
+        # Au-delà de la grille, tout est dehors : la case extrême la représente. Elle est
+        # dehors, ou au bord du contour et la cellule est alors testée exactement
+        low = np.clip(low, 0, [num_x - 1, num_y - 1])
+        high = np.clip(high, 0, [num_x - 1, num_y - 1])
+        # La case fait au moins un diamètre : deux cases au plus par axe
+        corners = [self.states[y[:, 1], x[:, 0]] for x in (low, high) for y in (low, high)]
+        corners = np.stack(corners, axis=1)
+        states = np.where((corners == INSIDE).all(axis=1), INSIDE,
+                          np.where((corners == OUTSIDE).all(axis=1), OUTSIDE, BOUNDARY))
+        return self.refine(centers, radius, states)
+
+    def refine(self, centers, radius, states):
+        # Les cases sont grossières : pour les cellules classées au bord, test exact de la
+        # distance du centre au contour, puis dedans / dehors par parité des croisements
+        starts, ends = self.outline, np.roll(self.outline, -1, axis=0)
+        direction = ends - starts
+        length = np.maximum((direction ** 2).sum(axis=1), 1e-300)
+        candidates = np.flatnonzero(states == BOUNDARY)
+        chunk = max(1, REFINE_PAIRS // len(starts))
+        for first in range(0, len(candidates), chunk):
+            selected = candidates[first:first + chunk]
+            points = centers[selected][:, None, :]
+            t = np.clip(((points - starts) * direction).sum(axis=2) / length, 0, 1)
+            distance = np.linalg.norm(points - (starts + t[..., None] * direction), axis=2).min(axis=1)
+            x, y = points[..., 0], points[..., 1]
+            crosses = (starts[:, 1] > y) != (ends[:, 1] > y)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                at = starts[:, 0] + (y - starts[:, 1]) * direction[:, 0] / direction[:, 1]
+            inside = (crosses & (x < at)).sum(axis=1) % 2 == 1
+            states[selected] = np.where(distance <= radius, BOUNDARY, np.where(inside, INSIDE, OUTSIDE))
+        return states
+
+
+def clip_outline(outline, window, tolerance=1e-9):
+    # Pièces (polygones dans le sens direct) de l'intersection du contour simple quelconque
+    # outline et de la fenêtre convexe window, tous deux dans le sens direct. Weiler-Atherton :
+    # les morceaux du contour dans la fenêtre forment des chaînes qui y entrent et en
+    # sortent par le bord ; de la sortie d'une chaîne, le bord de la fenêtre mène, dans le
+    # sens direct, à l'entrée suivante. Un contour concave peut donner plusieurs pièces
+    starts, ends = outline, np.roll(outline, -1, axis=0)
+    low, high = window.min(axis=0) - tolerance, window.max(axis=0) + tolerance
+    near = np.flatnonzero((np.minimum(starts, ends) <= high).all(axis=1) &
+                          (np.maximum(starts, ends) >= low).all(axis=1))
+    corners = window
+    direction = np.roll(window, -1, axis=0) - corners
+    lengths = np.hypot(direction[:, 0], direction[:, 1])
+
+    def distance(points):
+        # Distance signée (P, côtés) de chaque point à chaque côté, positive dedans ; un
+        # point à tolerance près d'un côté est posé dessus
+        values = (direction[:, 0] * (points[:, None, 1] - corners[:, 1]) -
+                  direction[:, 1] * (points[:, None, 0] - corners[:, 0])) / lengths
+        return np.where(np.abs(values) <= tolerance, 0, values)
+
+    def position(points):
+        # Abscisse curviligne sur le bord de la fenêtre : côté le plus proche + fraction
+        side = np.abs(distance(points)).argmin(axis=1)
+        fraction = ((points - corners[side]) * direction[side]).sum(axis=1) / lengths[side] ** 2
+        return (side + np.clip(fraction, 0, 1)) % len(window)
+
+    # Cyrus-Beck : partie [first, last] de chaque arête proche dans la fenêtre fermée
+    p, q = starts[near], ends[near]
+    before, after = distance(p), distance(q)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing = before / (before - after)
+    first = np.where((before < 0) & (after > 0), crossing, 0).max(axis=1, initial=0)
+    last = np.where((before > 0) & (after < 0), crossing, 1).min(axis=1, initial=1)
+    outside = (((before < 0) & (after <= 0)) | ((before <= 0) & (after < 0))).any(axis=1)
+    # Une arête posée sur un côté est laissée au parcours du bord : dans le même sens que
+    # le côté, le bord la retrace ; en sens inverse, elle ne fait que toucher la fenêtre
+    along = ((before == 0) & (after == 0)).any(axis=1)
+    span = (last - first) * np.hypot(*(q - p).T)
+    kept = ~outside & ~along & (span > tolerance)
+    if not kept.any():
+        # Le contour n'entre pas dans la fenêtre : elle est entièrement dedans ou dehors
+        center = corners.mean(axis=0)
+        crosses = (starts[:, 1] > center[1]) != (ends[:, 1] > center[1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            at = starts[:, 0] + (center[1] - starts[:, 1]) * (ends[:, 0] - starts[:, 0]) / (ends[:, 1] - starts[:, 1])
+        return [window.copy()] if (crosses & (center[0] < at)).sum() % 2 else []
+    edges, first, last, p, q = near[kept], first[kept], last[kept], p[kept], q[kept]
+    entry = np.where((first == 0)[:, None], p, p + first[:, None] * (q - p))
+    leave = np.where((last == 1)[:, None], q, p + last[:, None] * (q - p))
+    # Une arête prolonge la précédente quand elle repart du point où celle-ci s'arrête
+    linked = (np.roll(edges, 1) + 1) % len(outline) == edges
+    linked &= (np.roll(last, 1) == 1) & (first == 0)
+    if linked.all():
+        return [outline.copy()] if len(edges) == len(outline) else []
+    heads = np.flatnonzero(~linked)
+    tails = np.roll(heads, -1) - 1
+    tails[-1] += len(edges)
+    chains = [np.vstack((entry[head:head + 1], leave[np.arange(head, tail + 1) % len(edges)]))
+              for head, tail in zip(heads, tails)]
+    entries = position(entry[heads])
+    exits = position(leave[tails % len(edges)])
+
+    pieces, used = [], np.zeros(len(chains), dtype=bool)
+    for start in range(len(chains)):
+        if used[start]:
+            continue
+        parts, chain = [], start
+        while True:
+            used[chain] = True
+            parts.append(chains[chain])
+            # Entrée suivante dans le sens du bord ; une entrée confondue avec la sortie,
+            # à l'arrondi près, vient juste après
+            gap = (entries - exits[chain]) % len(window)
+            gap[gap > len(window) - tolerance] = 0
+            gap[used & (np.arange(len(chains)) != start)] = np.inf
+            following = int(gap.argmin())
+            if not np.isfinite(gap[following]):
+                break
+            side = math.floor(exits[chain]) + 1
+            walked = []
+            while side - exits[chain] < gap[following] - tolerance:
+                walked.append(corners[side % len(window)])
+                side += 1
+            if walked:
+                parts.append(np.array(walked))
+            if following == start:
+                break
+            chain = following
+        piece = clean(np.vstack(parts))
+        if len(piece) >= 3 and signed_area(piece) > tolerance:
+            pieces.append(piece)
+    return pieces
+
+
+def contained(window, offsets, outline):
+    # Indices des décalages où la fenêtre convexe, déplacée, est entièrement dans le contour
+    window, outline = counterclockwise(window), counterclockwise(outline)
+    full_area = abs(signed_area(window))
+    return np.array([index for index, offset in enumerate(offsets)
+                     if abs(sum(signed_area(piece) for piece in clip_outline(outline, window + offset)) - full_area)
+                     <= 1e-9 * max(full_area, 1.0)], dtype=int)
+
+
+def clean(polygon, tolerance=1e-9):
+    # Retire les points doublés et alignés laissés par la découpe
+    if not len(polygon):
+        return polygon
+    keep = np.linalg.norm(polygon - np.roll(polygon, 1, axis=0), axis=1) > tolerance
+    polygon = polygon[keep]
+    while len(polygon) >= 3:
+        before, after = np.roll(polygon, 1, axis=0), np.roll(polygon, -1, axis=0)
+        cross = (polygon[:, 0] - before[:, 0]) * (after[:, 1] - before[:, 1]) - \
+                (polygon[:, 1] - before[:, 1]) * (after[:, 0] - before[:, 0])
+        straight = np.abs(cross) <= tolerance
+        if not straight.any():
+            break
+        polygon = polygon[~straight]
+    return polygon
+
+
+def ear_clip(polygon):
+    # Triangulation par oreilles d'un polygone simple dans le sens direct ; indices (T, 3).
+    # Sommets en liste chaînée et parcours continu ; une oreille n'est testée que contre
+    # les sommets restants de sa bande d'abscisses, bords compris (un sommet convexe posé
+    # sur la diagonale la bloque aussi). Un sommet aligné avec ses voisins n'est jamais la
+    # pointe d'une oreille : pas de triangle plat
+    polygon = np.asarray(polygon, dtype=float)
+    count = len(polygon)
+    following = np.roll(np.arange(count), -1)
+    previous = np.roll(np.arange(count), 1)
+    alive = np.ones(count, dtype=bool)
+
+    def convex(k):
+        a, c = polygon[previous[k]], polygon[following[k]]
+        before, after = polygon[k] - a, c - polygon[k]
+        cross = before[0] * after[1] - before[1] * after[0]
+        return cross > 1e-9 * math.hypot(*before) * math.hypot(*after)
+
+    corners = np.array([convex(k) for k in range(count)], dtype=bool)
+    by_x = np.argsort(polygon[:, 0], kind='stable')
+    sorted_x = polygon[by_x, 0]
+    triangles = []
+    remaining, k, stalled = count, 0, 0
+    while remaining > 3 and stalled <= remaining:
+        a, c = previous[k], following[k]
+        if corners[k]:
+            ear = polygon[[a, k, c]]
+            low = np.searchsorted(sorted_x, ear[:, 0].min(), side='left')
+            high = np.searchsorted(sorted_x, ear[:, 0].max(), side='right')
+            candidates = by_x[low:high]
+            candidates = candidates[alive[candidates] & (candidates != a) & (candidates != k) & (candidates != c)]
+            points = polygon[candidates]
+            blocked = inside_triangle(points, *ear)
+            # Un sommet confondu avec un coin de l'oreille (contour qui se touche) ne la bloque pas
+            blocked &= ~((points == ear[0]).all(axis=1) | (points == ear[2]).all(axis=1))
+            if not blocked.any():
+                triangles.append([a, k, c])
+                alive[k] = False
+                following[a], previous[c] = c, a
+                remaining -= 1
+                for corner in (a, c):
+                    corners[corner] = convex(corner)
+                k, stalled = a, 0
+                continue
+        k = following[k]
+        stalled += 1
+    # Reste (trois sommets, ou polygone dégénéré) : un éventail ferme la surface
+    rest = [k]
+    while following[rest[-1]] != k:
+        rest.append(following[rest[-1]])
+    triangles.extend([rest[0], rest[i], rest[i + 1]] for i in range(1, len(rest) - 1))
+    return np.array(triangles, dtype=int).reshape(-1, 3)
+
+
+def inside_triangle(points, a, b, c, tolerance=1e-9):
+    # Points dans le triangle, bords compris à tolerance près (relative à la longueur du côté) :
+    # un sommet posé sur la diagonale, à l'arrondi près, bloque l'oreille
+    def side(p, q):
+        cross = (q[0] - p[0]) * (points[:, 1] - p[1]) - (q[1] - p[1]) * (points[:, 0] - p[0])
+        return cross >= -tolerance * ((q[0] - p[0]) ** 2 + (q[1] - p[1]) ** 2)
+    return side(a, b) & side(b, c) & side(c, a)
+
+
+def clipped_prism(polygon, height):
+    # Prisme fermé sur un contour simple quelconque : dessus et dessous par oreilles, murs par arête
+    count = len(polygon)
+    caps = ear_clip(polygon)
+    ring = np.arange(count)
+    following = (ring + 1) % count
+    vertices = np.vstack((np.column_stack((polygon, np.zeros(count))),
+                          np.column_stack((polygon, np.full(count, height)))))
+    faces = np.vstack((caps[:, ::-1], caps + count,
+                       np.column_stack((ring, following, count + following)),
+                       np.column_stack((ring, count + following, count + ring))))
+    return vertices, faces
+
+
+def clip_cells(footprint, height, offsets, outline, angles=None):
+    # Découpe les cellules du bord, tournées de angles s'il y en a : renvoie (sommets, faces)
+    # de toutes les pièces, et les indices des cellules qui se révèlent entièrement dedans
+    footprint = counterclockwise(footprint)
+    outline = counterclockwise(clean(np.asarray(outline, dtype=float)))
+    full_area = abs(signed_area(footprint))
+    vertices, faces, whole = [], [], []
+    base = 0
+    for index, offset in enumerate(offsets):
+        window = footprint
+        if angles is not None:
+            cos, sin = np.cos(angles[index]), np.sin(angles[index])
+            window = footprint @ np.array([[cos, sin], [-sin, cos]])
+        pieces = clip_outline(outline, window + offset)
+        if len(pieces) == 1 and abs(signed_area(pieces[0]) - full_area) <= 1e-9 * max(full_area, 1.0):
+            whole.append(index)
+            continue
+        # Un contour concave peut couper la cellule en plusieurs pièces séparées
+        for piece in pieces:
+            piece_vertices, piece_faces = clipped_prism(piece, height)
+            vertices.append(piece_vertices)
+            faces.append(piece_faces + base)
+            base += len(piece_vertices)
+    if not vertices:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=int), np.array(whole, dtype=int)
+    return np.vstack(vertices), np.vstack(faces), np.array(whole, dtype=int)
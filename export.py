@@ -0,0 +1,102 @@
+import os
+import struct
+import numpy as np
+from stl import mesh as stlmesh
+from tiling import STREAM_BAND_TRIANGLES
+from profiling import stage
+
+HEADER_SIZE = 80
+COUNT_FORMAT = '<I'
+
+
+def save_stream(filename, bands, name='pattern'):
+    # Écrit un STL binaire au fil des bandes : en-tête et nombre de triangles
+    # provisoire, puis les triangles, et enfin on revient corriger le nombre
+    count = 0
+    with open(filename, 'wb') as fh:
+        fh.write(name.encode('ascii', 'replace')[:HEADER_SIZE].ljust(HEADER_SIZE, b' '))
+        fh.write(struct.pack(COUNT_FORMAT, 0))
+        for data in bands:
+            with stage('write', triangles=len(data), bytes=len(data) * stlmesh.Mesh.dtype.itemsize):
+                np.asarray(data, dtype=stlmesh.Mesh.dtype).tofile(fh)
+            count += len(data)
+        fh.seek(HEADER_SIZE)
+        fh.write(struct.pack(COUNT_FORMAT, count))
+    return count
+
+
+def stl_layout(filename):
+    # (en-tête, nombre de triangles, position du premier triangle) d'un STL binaire
+    with open(filename, 'rb') as fh:
+        header = fh.read(HEADER_SIZE)
+        raw_count = fh.read(struct.calcsize(COUNT_FORMAT))
+    if len(raw_count) < struct.calcsize(COUNT_FORMAT):
+        raise ValueError(f"{filename} : fichier STL tronqué")
+    count, = struct.unpack(COUNT_FORMAT, raw_count)
+    offset = HEADER_SIZE + struct.calcsize(COUNT_FORMAT)
+    size = os.path.getsize(filename)
+    if size != offset + count * stlmesh.Mesh.dtype.itemsize:
+        # Taille incohérente : STL ASCII, ou fichier tronqué
+        raise ValueError(f"{filename} : pas un STL binaire valide ({count} triangles annoncés, {size} octets)")
+    return header.decode('ascii', 'replace').rstrip(' \0'), count, offset
+
+
+def map_stl(filename):
+    # Projette un STL binaire en mémoire sans rien copier : (en-tête, tableau Mesh.dtype
+    # en lecture seule). Seules les pages réellement lues sont chargées par le système
+    name, count, offset = stl_layout(filename)
+    if not count:
+        return name, np.zeros(0, dtype=stlmesh.Mesh.dtype)
+    return name, np.memmap(filename, dtype=stlmesh.Mesh.dtype, mode='r', offset=offset, shape=(count,))
+
+
+def map_chunks(filename, size=STREAM_BAND_TRIANGLES):
+    # Même projection, mais un bloc à la fois : chaque bloc est libéré avant le suivant,
+    # donc la mémoire résidente reste bornée par un bloc quelle que soit la taille du fichier
+    _, count, offset = stl_layout(filename)
+    for start in range(0, count, size):
+        chunk = np.memmap(filename, dtype=stlmesh.Mesh.dtype, mode='r',
+                          offset=offset + start * stlmesh.Mesh.dtype.itemsize, shape=(min(size, count - start),))
+        yield chunk
+        del chunk
+
+
+def split(data, size=STREAM_BAND_TRIANGLES):
+    # Découpe un tableau de triangles (éventuellement projeté en mémoire) en bandes
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+PLY_VERTEX = np.dtype([('xyz', '<f4', (3,))])
+PLY_FACE = np.dtype([('count', 'u1'), ('indices', '<i4', (3,))])
+
+
+def save_ply(filename, bands, num_vertices, num_faces, name='pattern'):
+    # PLY binaire indexé : chaque sommet n'est écrit qu'une fois. Les nombres de
+    # sommets et de faces sont connus d'avance, donc chaque bande (sommets, faces)
+    # est écrite directement à sa place dans les deux sections du fichier
+    header = (
+        "ply\nformat binary_little_endian 1.0\n"
+        f"comment {name}\n"
+        f"element vertex {num_vertices}\nproperty float x\nproperty float y\nproperty float z\n"
+        f"element face {num_faces}\nproperty list uchar int vertex_indices\n"
+        "end_header\n"
+    ).encode('ascii', 'replace')
+    vertex_position = len(header)
+    face_position = vertex_position + num_vertices * PLY_VERTEX.itemsize
+    with open(filename, 'wb') as fh:
+        fh.write(header)
+        for vertices, faces in bands:
+            with stage('write', triangles=len(faces),
+                       bytes=len(vertices) * PLY_VERTEX.itemsize + len(faces) * PLY_FACE.itemsize):
+                fh.seek(vertex_position)
+                np.asarray(vertices, dtype='<f4').tofile(fh)
+                vertex_position = fh.tell()
+
+                records = np.empty(len(faces), dtype=PLY_FACE)
+                records['count'] = 3
+                records['indices'] = faces
+                fh.seek(face_position)
+                records.tofile(fh)
+                face_position = fh.tell()
+    return num_faces
@@ -0,0 +1,187 @@
+# Génération sans interface graphique : aucune dépendance à Qt, pour les
+# lots de plaques sur des machines sans écran
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from stl import mesh as stlmesh
+from shapes import PATTERNS, PLATE
+from export import HEADER_SIZE, save_stream, save_ply, split
+from repair import repair, to_triangles, format_report
+import profiling
+
+# À incrémenter dès que la géométrie produite change : invalide caches et fichiers existants
+GENERATOR_VERSION = 5
+
+# Formes disponibles : tous les motifs enregistrés dans shapes
+SHAPES = PATTERNS
+
+# Réglages d'exécution : ils ne changent pas la géométrie, donc ni le nom ni l'empreinte
+RUNTIME_KEYS = {'workers', 'band_rows'}
+
+
+class Cancelled(Exception):
+    pass
+
+
+def parameters_for(shape, params):
+    # Paramètres canoniques : chaque clé du schéma prend sa valeur par défaut si elle manque,
+    # et une plaque de base nulle ou un remplissage non demandé disparaissent. Le formulaire,
+    # qui envoie tout, et la ligne de commande, qui omet, donnent ainsi la même empreinte
+    # et le même nom de fichier pour la même plaque
+    if shape not in SHAPES:
+        raise ValueError(f"Forme inconnue : {shape} (choix : {', '.join(SHAPES)})")
+    canonical = {param.key: param.default for param in SHAPES[shape].parameter_schema()}
+    canonical.update((key, value) for key, value in params.items() if value is not None)
+    for key in ('base_thickness', 'fill', 'outline'):
+        if not canonical.get(key):
+            canonical.pop(key, None)
+    return canonical
+
+
+def geometry(params):
+    return {key: value for key, value in sorted(params.items()) if key not in RUNTIME_KEYS}
+
+
+def outline_digest(outline):
+    # Un contour lu dans un fichier entre dans l'empreinte par son contenu, pas par son
+    # chemin : modifier le fichier invalide le cache et les fichiers déjà générés
+    if outline in ('rectangle', 'circle') or not os.path.isfile(outline):
+        return outline
+    with open(outline, 'rb') as fh:
+        return 'sha1:' + hashlib.sha1(fh.read()).hexdigest()
+
+
+def parameters_hash(shape, params):
+    # Empreinte stable des paramètres géométriques (1 et 1.0 donnent la même)
+    canonical = {key: float(value) if isinstance(value, (int, float)) else value
+                 for key, value in geometry(parameters_for(shape, params)).items()}
+    if isinstance(canonical.get('outline'), str):
+        canonical['outline'] = outline_digest(canonical['outline'])
+    payload = json.dumps([GENERATOR_VERSION, shape, canonical], sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def filename_for(shape, params):
+    # Nom de fichier construit à partir des paramètres, par ordre alphabétique
+    # (un chemin de contour est réduit au nom du fichier)
+    parts = [f"{key}-{value:g}" if isinstance(value, (int, float))
+             else f"{key}-{os.path.splitext(os.path.basename(value))[0]}"
+             for key, value in geometry(parameters_for(shape, params)).items()]
+    return "_".join([shape] + parts) + ".stl"
+
+
+def header_for(shape, params):
+    # L'en-tête STL porte l'empreinte, ce qui permet de reconnaître un fichier à jour
+    return f"{shape} {parameters_hash(shape, params)}"
+
+
+def read_header(filename):
+    try:
+        with open(filename, 'rb') as fh:
+            return fh.read(HEADER_SIZE).decode('ascii', 'replace').rstrip(' \0')
+    except OSError:
+        return None
+
+
+def generate(shape, params, cache=None):
+    # Renvoie le maillage complet de la plaque (stlmesh.Mesh)
+    if cache is not None:
+        return stlmesh.Mesh(cache.fetch(shape, params), calculate_normals=False, remove_empty_areas=False)
+    return SHAPES[shape](parameters_for(shape, params)).generate_mesh()
+
+
+def generate_indexed(shape, params):
+    # Renvoie (sommets float32, faces int32) sans duplication des sommets partagés
+    return SHAPES[shape](parameters_for(shape, params)).generate_indexed()
+
+
+def save(shape, params, filename, cache=None, progress=None):
+    # Écrit la plaque bande par bande et renvoie le nombre de triangles ; un nom
+    # en .ply donne un PLY binaire indexé, sinon un STL binaire.
+    # progress(cellules faites, cellules totales) est appelé après chaque bande ;
+    # il peut lever Cancelled pour interrompre la génération
+    if filename.lower().endswith('.ply'):
+        return SHAPES[shape](parameters_for(shape, params)).save_ply(filename, header_for(shape, params), progress)
+    if cache is not None:
+        return save_stream(filename, split(cache.fetch(shape, params, progress)), header_for(shape, params))
+    return SHAPES[shape](parameters_for(shape, params)).save(filename, header_for(shape, params), progress)
+
+
+def save_repaired(shape, params, filename, cache=None):
+    # Comme save, avec une passe de validation et de réparation sur la plaque entière :
+    # elle est donc construite en mémoire. Renvoie (nombre de triangles, rapport)
+    mesh = generate(shape, params, cache)
+    vertices, faces, report = repair(mesh.vectors)
+    if filename.lower().endswith('.ply'):
+        save_ply(filename, [(vertices.astype('<f4'), faces)], len(vertices), len(faces), header_for(shape, params))
+    else:
+        save_stream(filename, split(to_triangles(vertices, faces)), header_for(shape, params))
+    return len(faces), report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Génère une plaque STL de motifs sans interface graphique.")
+    parser.add_argument('--shape', required=True, choices=list(SHAPES))
+    parser.add_argument('--output', '-o', help="Fichier de sortie .stl ou .ply (défaut : <forme>.stl)")
+    # Une option par paramètre des motifs enregistrés, la première déclaration donnant l'aide
+    plate_keys = {param.key for param in PLATE}
+    seen = set()
+    for pattern in SHAPES.values():
+        for param in pattern.parameter_schema():
+            if param.key in seen or param.key in plate_keys:
+                continue
+            seen.add(param.key)
+            parser.add_argument('--' + param.key.replace('_', '-'), dest=param.key, type=param.type, help=param.help)
+    parser.add_argument('--outline', help="Contour de découpe : rectangle, circle ou fichier de points (JSON ou texte)")
+    parser.add_argument('--fill', action='store_true', default=None,
+                        help="Remplit le contour jusqu'au bord (cellules du bord découpées)")
+    parser.add_argument('--width', type=float, required=True, help="Largeur de la surface (mm)")
+    parser.add_argument('--height-dimension', '--depth', dest='height_dimension', type=float, required=True,
+                        help="Hauteur de la surface (mm)")
+    parser.add_argument('--workers', type=int, help="Nombre de processus (1 force le chemin série)")
+    parser.add_argument('--band-rows', dest='band_rows', type=int, help="Lignes de cellules par bande")
+    parser.add_argument('--repair', action='store_true',
+                        help="Vérifie et répare la plaque avant l'écriture (soudure, dégénérés, arêtes)")
+    parser.add_argument('--cache', action='store_true', help="Réutilise le cache des maillages déjà générés")
+    parser.add_argument('--profile', metavar='TRACE', help="Mesure chaque étape et écrit une trace Chrome (JSON)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = vars(parser.parse_args(argv))
+    shape = args.pop('shape')
+    filename = os.path.abspath(args.pop('output') or f"{shape}.stl")
+    trace = args.pop('profile')
+    recorder = profiling.enable() if trace else None
+    cache = None
+    if args.pop('cache'):
+        from cache import MeshCache
+        cache = MeshCache()
+    repair_pass = args.pop('repair')
+    report = None
+    try:
+        if repair_pass:
+            count, report = save_repaired(shape, args, filename, cache=cache)
+        else:
+            count = save(shape, args, filename, cache=cache)
+    except KeyError as missing:
+        parser.error(f"paramètre manquant pour {shape} : {missing.args[0]}")
+    except ZeroDivisionError:
+        parser.error(f"paramètre nul pour {shape} : tailles, espacements et tolérances doivent être non nuls")
+    except (ValueError, OSError) as error:
+        parser.error(str(error))
+    print(f"{filename} : {count} triangles")
+    if report:
+        print(format_report(report))
+    if recorder:
+        print(recorder.format())
+        recorder.save_trace(trace)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# Régénération incrémentale pour l'interface : la dernière plaque reste dans le
+# cache des maillages (fichier projeté en mémoire), et un changement de hauteur
+# ou de taille de plaque est appliqué bande par bande à partir de ce fichier au
+# lieu de tout retamponner. La mémoire reste bornée par une bande.
+
+import numpy as np
+from stl import mesh as stlmesh
+from generator import SHAPES, RUNTIME_KEYS, parameters_for, parameters_hash, header_for
+from export import save_stream, split
+from tiling import STREAM_BAND_TRIANGLES, fill, prepare, triangulate
+from profiling import stage
+
+# Seuls ces paramètres donnent un delta ; tout autre changement reconstruit la plaque
+HEIGHT_KEYS = {'height'}
+PLATE_KEYS = {'width', 'height_dimension'}
+
+
+class Regenerator:
+    # Sans cache, pas de plaque source sur le disque : chaque demande est une génération
+    # complète écrite au fil des bandes
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.last = None
+
+    def changes(self, shape, params):
+        # Clés géométriques modifiées depuis le dernier résultat, ou None s'il faut tout refaire
+        if self.last is None or self.last['shape'] != shape:
+            return None
+        previous = self.last['params']
+        if params.get('outline') or params.get('fill'):
+            # Les cellules découpées dépendent de tout le contour : pas de delta
+            return None
+        keys = (set(previous) | set(params)) - RUNTIME_KEYS
+        return {key for key in keys if previous.get(key) != params.get(key)}
+
+    def generate(self, shape, params, progress=None):
+        # Triangles de la plaque (tableau Mesh.dtype projeté depuis le cache), par delta
+        # quand c'est possible
+        if self.cache is None:
+            return SHAPES[shape](parameters_for(shape, params)).generate_mesh().data
+        params = parameters_for(shape, params)
+        key = parameters_hash(shape, params)
+        pattern = SHAPES[shape](params)
+        vertices, faces, offsets, angles, num_x = pattern.describe()
+        template, offsets, angles = prepare(triangulate(vertices, faces), offsets, angles)
+
+        data = self.cache.get(key)
+        if data is None:
+            delta = self.delta(shape, params, template, offsets, angles, num_x)
+            if delta is None:
+                data = self.cache.fetch(shape, params, progress)
+            else:
+                extra = pattern.extra_triangles()
+                count = len(offsets) * len(template) + (0 if extra is None else len(extra))
+                data = self.cache.put(key, count, self.delta_bands(delta, template, offsets, extra, progress))
+        elif progress:
+            progress(len(offsets), len(offsets))
+
+        self.last = {'shape': shape, 'params': params, 'cells': data[:len(offsets) * len(template)],
+                     'offsets': offsets, 'num_x': num_x, 'num_faces': len(template)}
+        return data
+
+    def delta(self, shape, params, template, offsets, angles, num_x):
+        # Bloc de lignes et de colonnes repris de la plaque précédente, ou None s'il faut tout refaire.
+        # Le réseau garde son origine : seule la partie commune des deux grilles est recopiée
+        changed = self.changes(shape, params)
+        if changed is None or not changed <= HEIGHT_KEYS | PLATE_KEYS or angles is not None:
+            return None
+        old_offsets, old_x = self.last['offsets'], self.last['num_x']
+        if not num_x or not old_x or len(template) != self.last['num_faces']:
+            return None
+        if changed & HEIGHT_KEYS and not self.last['params'].get('height'):
+            return None
+        old_y, num_y = len(old_offsets) // old_x, len(offsets) // num_x
+        keep_x, keep_y = min(old_x, num_x), min(old_y, num_y)
+        old_grid = old_offsets.reshape(old_y, old_x, 2)[:keep_y, :keep_x]
+        if not np.allclose(old_grid, offsets.reshape(num_y, num_x, 2)[:keep_y, :keep_x]):
+            return None
+        source = self.last['cells'].reshape(old_y, old_x, len(template))
+        factor = params['height'] / self.last['params']['height'] if changed & HEIGHT_KEYS else None
+        return source, num_y, keep_x, keep_y, factor
+
+    def delta_bands(self, delta, template, offsets, extra, progress):
+        # Bandes de lignes de la nouvelle plaque : le bloc commun est lu dans la plaque
+        # source, les cellules ajoutées sont tamponnées, puis vient la géométrie non répétée
+        source, num_y, keep_x, keep_y, factor = delta
+        num_x, num_faces = len(offsets) // num_y, len(template)
+        grid = offsets.reshape(num_y, num_x, 2)
+        band_rows = max(1, STREAM_BAND_TRIANGLES // (num_x * num_faces))
+        for first in range(0, num_y, band_rows):
+            last = min(first + band_rows, num_y)
+            with stage('delta', cells=(last - first) * num_x):
+                data = np.zeros((last - first) * num_x * num_faces, dtype=stlmesh.Mesh.dtype)
+                rows = data.reshape(last - first, num_x, num_faces)
+                kept = max(min(last, keep_y) - first, 0)
+                if kept:
+                    rows[:kept, :keep_x] = source[first:first + kept, :keep_x]
+                    if factor is not None:
+                        self.rescale(rows[:kept, :keep_x], template, factor)
+                if kept and num_x > keep_x:
+                    columns = rows[:kept, keep_x:]
+                    block = np.zeros(columns.size, dtype=stlmesh.Mesh.dtype)
+                    fill(block, template, grid[first:first + kept, keep_x:].reshape(-1, 2))
+                    columns[...] = block.reshape(columns.shape)
+                if kept < last - first:
+                    fill(rows[kept:].reshape(-1), template, grid[first + kept:last].reshape(-1, 2))
+            yield data
+            if progress:
+                progress(last * num_x, len(offsets))
+        if extra is not None and len(extra):
+            # La géométrie non répétée (murs de la plaque de base) est toujours recalculée
+            data = np.zeros(len(extra), dtype=stlmesh.Mesh.dtype)
+            fill(data, np.asarray(extra, dtype=np.float64), np.zeros((1, 2)))
+            yield data
+
+    def rescale(self, cells, template, factor):
+        # Hauteur : z ne dépend que du gabarit, pas du décalage de la cellule, donc il est
+        # repris tel quel du nouveau gabarit ; x et y ne bougent pas. Les cellules (z >= 0)
+        # subissent l'échelle (1, 1, k) et leurs normales, transformées par la comatrice,
+        # deviennent (k nx, k ny, nz) sans produit vectoriel ; sous le sol, il n'y a que les
+        # dessous horizontaux de la plaque (nx = ny = 0). Les sommets sont ceux d'une génération
+        # complète au bit près, les normales à l'arrondi float32 près
+        with stage('rescale', triangles=cells.size):
+            cells['vectors'][..., 2] = template[..., 2]
+            cells['normals'][..., :2] *= np.float32(factor)
+
+    def save(self, shape, params, filename, progress=None):
+        # Même géométrie et même en-tête qu'une génération complète
+        if self.cache is None:
+            return SHAPES[shape](parameters_for(shape, params)).save(filename, header_for(shape, params), progress)
+        data = self.generate(shape, params, progress)
+        return save_stream(filename, split(data), header_for(shape, params))
@@ -1,11 +1,17 @@
 # main.py
 
 import sys
-from PyQt5.QtWidgets import QApplication
-from shape_generator import ShapeGenerator
-from PyQt5.QtGui import QPalette, QColor
 
 def main():
+    # Avec des arguments, on génère sans interface : Qt n'est jamais importé
+    if len(sys.argv) > 1:
+        from generator import main as generate_main
+        sys.exit(generate_main())
+
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtGui import QPalette, QColor
+    from shape_generator import ShapeGenerator
+
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
 
@@ -33,4 +39,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
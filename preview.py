@@ -0,0 +1,78 @@
+# Aperçu à niveaux de détail : seule une zone de cellules proche du centre de
+# la vue est maillée en détail, le reste de la plaque est représenté par un
+# point par cellule. Aucune dépendance à Qt : les tableaux sont prêts pour pyqtgraph.
+
+import numpy as np
+from generator import SHAPES, parameters_for
+from tiling import fan, prepare, tile_indexed
+
+# Budget de triangles de la zone détaillée : au-delà, le visualiseur perd sa fluidité
+DETAIL_TRIANGLES = 300_000
+# Nombre maximal de points de la représentation simplifiée
+STAND_IN_POINTS = 250_000
+
+
+class Preview:
+    def __init__(self, shape, params):
+        pattern = SHAPES[shape](parameters_for(shape, params))
+        vertices, faces, offsets, angles, _ = pattern.describe()
+        self.vertices, self.offsets, self.angles = prepare(vertices, offsets, angles)
+        self.faces = fan(faces)
+        self.top = float(self.vertices[:, 2].max()) if len(self.vertices) else 0.0
+        # Géométrie non répétée (murs de la plaque de base, cellules découpées du bord) :
+        # toujours affichée en entier, en plus des cellules détaillées
+        extra = pattern.extras()
+        if extra is None:
+            self.extra_vertices, self.extra_faces = np.zeros((0, 3), dtype=np.float32), np.zeros((0, 3), dtype=np.int32)
+        else:
+            self.extra_vertices = np.asarray(extra[0], dtype=np.float32)
+            self.extra_faces = np.asarray(extra[1], dtype=np.int32)
+
+    def cell_count(self):
+        return len(self.offsets)
+
+    def complete(self, budget=DETAIL_TRIANGLES):
+        # Vrai si la plaque entière tient dans le budget de la zone détaillée
+        return len(self.offsets) * len(self.faces) + len(self.extra_faces) <= budget
+
+    def extent(self):
+        # (xmin, ymin, xmax, ymax) de la plaque, cellules et géométrie non répétée comprises
+        lows, highs = [], []
+        if len(self.offsets):
+            lows.append(self.offsets.min(axis=0) + self.vertices[:, :2].min(axis=0))
+            highs.append(self.offsets.max(axis=0) + self.vertices[:, :2].max(axis=0))
+        if len(self.extra_vertices):
+            lows.append(self.extra_vertices[:, :2].min(axis=0))
+            highs.append(self.extra_vertices[:, :2].max(axis=0))
+        if not lows:
+            return 0.0, 0.0, 0.0, 0.0
+        low, high = np.min(lows, axis=0), np.max(highs, axis=0)
+        return low[0], low[1], high[0], high[1]
+
+    def detail(self, center=None, budget=DETAIL_TRIANGLES):
+        # (sommets, faces) indexés des cellules les plus proches de center (x, y), suivis
+        # de la géométrie non répétée qui prend sa part du budget
+        budget = max(budget - len(self.extra_faces), 0)
+        count = min(len(self.offsets), max(1, budget // max(len(self.faces), 1)))
+        if count < len(self.offsets):
+            if center is None:
+                xmin, ymin, xmax, ymax = self.extent()
+                center = ((xmin + xmax) / 2, (ymin + ymax) / 2)
+            distances = ((self.offsets - np.asarray(center, dtype=np.float32)) ** 2).sum(axis=1)
+            cells = np.sort(np.argpartition(distances, count - 1)[:count])
+        else:
+            cells = slice(None)
+        angles = None if self.angles is None else self.angles[cells]
+        vertices, faces = tile_indexed(self.vertices, self.faces, self.offsets[cells], angles)
+        if not len(self.extra_faces):
+            return vertices, faces
+        return (np.vstack((vertices, self.extra_vertices)),
+                np.vstack((faces, (self.extra_faces + len(vertices)).astype(faces.dtype))))
+
+    def stand_in(self, max_points=STAND_IN_POINTS):
+        # Un point par cellule au sommet de la cellule, sous-échantillonné si nécessaire
+        step = max(1, -(-len(self.offsets) // max_points))
+        points = np.empty((len(self.offsets[::step]), 3), dtype=np.float32)
+        points[:, :2] = self.offsets[::step]
+        points[:, 2] = self.top
+        return points
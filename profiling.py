@@ -0,0 +1,111 @@
+# Instrumentation optionnelle du pipeline de génération. Désactivée, stage()
+# renvoie un contexte vide partagé : ni horloge lue ni événement alloué.
+# Activée, chaque étape enregistre sa durée et ses tailles, exportables au
+# format Chrome trace (chrome://tracing, Perfetto).
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+ENVIRONMENT_VARIABLE = 'STL_PATTERN_PROFILE'
+
+_recorder = None
+_NOOP = nullcontext()
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+        self.origin = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.events.append({
+                'name': name,
+                'start': start - self.origin,
+                'duration': time.perf_counter() - start,
+                'thread': threading.get_ident(),
+                'args': args
+            })
+
+    def clear(self):
+        self.events = []
+        self.origin = time.perf_counter()
+
+    def summary(self):
+        # Par étape : durée cumulée, nombre d'appels et somme des tailles numériques
+        stages = {}
+        for event in list(self.events):
+            total = stages.setdefault(event['name'], {'seconds': 0.0, 'calls': 0})
+            total['seconds'] += event['duration']
+            total['calls'] += 1
+            for key, value in event['args'].items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    total[key] = total.get(key, 0) + value
+        return stages
+
+    def format(self):
+        parts = []
+        for name, total in self.summary().items():
+            text = f"{name} {total['seconds'] * 1000:.1f} ms"
+            if 'triangles' in total:
+                text += f", {total['triangles']:,} triangles"
+            if 'bytes' in total:
+                text += f", {total['bytes'] / 1024 ** 2:.1f} Mo"
+            parts.append(text)
+        return " | ".join(parts)
+
+    def save_trace(self, filename):
+        pid = os.getpid()
+        events = [{
+            'name': event['name'],
+            'ph': 'X',
+            'ts': event['start'] * 1e6,
+            'dur': event['duration'] * 1e6,
+            'pid': pid,
+            'tid': event['thread'],
+            'args': event['args']
+        } for event in list(self.events)]
+        with open(filename, 'w') as fh:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fh)
+
+
+def stage(name, **args):
+    if _recorder is None:
+        return _NOOP
+    return _recorder.stage(name, **args)
+
+
+def enable():
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder()
+    return _recorder
+
+
+def disable():
+    global _recorder
+    _recorder = None
+
+
+def recorder():
+    return _recorder
+
+
+def enable_from_environment():
+    # STL_PATTERN_PROFILE=1 active l'instrumentation ; un chemin en .json y écrit aussi la trace
+    value = os.environ.get(ENVIRONMENT_VARIABLE)
+    if not value or value == '0':
+        return None
+    return enable()
+
+
+def trace_path_from_environment():
+    value = os.environ.get(ENVIRONMENT_VARIABLE, '')
+    return value if value.lower().endswith('.json') else None
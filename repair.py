@@ -0,0 +1,255 @@
+# Validation et réparation d'un maillage, entièrement sur tableaux : soudure des
+# sommets à une tolérance près, retrait des triangles dégénérés ou en double,
+# contrôle des arêtes (bord, non manifold), orientation rendue cohérente dans chaque
+# composante connexe et normales recalculées.
+
+import argparse
+import itertools
+import json
+import sys
+import numpy as np
+from stl import mesh as stlmesh
+from export import map_stl, save_stream, split
+from profiling import stage
+from stats import DEGENERATE_AREA, row_cross
+
+# Distance en dessous de laquelle deux sommets sont soudés (mm)
+WELD_TOLERANCE = 1e-4
+
+
+def weld(triangles, tolerance=WELD_TOLERANCE):
+    # (sommets, faces) : les sommets tombant dans la même case de la grille de pas
+    # tolerance sont fusionnés ; le premier rencontré donne sa position. Deux sommets
+    # proches mais de part et d'autre d'un bord de case resteraient séparés : la soudure
+    # est refaite sur les grilles décalées d'une demi-case selon chaque combinaison d'axes.
+    # Deux sommets à moins de tolerance / 2 sur chaque axe partagent alors une case au
+    # moins une fois
+    points = np.asarray(triangles).reshape(-1, 3)
+    shifts = itertools.product((0.0, 0.5), repeat=3)
+    first, inverse = snap(points, tolerance, next(shifts))
+    vertices = points[first].astype(np.float64)
+    for shift in shifts:
+        first, merged = snap(vertices, tolerance, shift)
+        if len(first) < len(vertices):
+            vertices, inverse = vertices[first], merged[inverse]
+    return vertices, inverse.reshape(-1, 3).astype(np.int32 if len(vertices) < 2 ** 31 else np.int64)
+
+
+def snap(points, tolerance, shift):
+    # (indice du premier point de chaque case, case de chaque point) sur la grille de pas
+    # tolerance décalée de shift cases
+    keys = [np.floor(points[:, axis] / tolerance + (0.5 - shift[axis])).astype(np.int64) for axis in range(3)]
+    lows = [int(key.min()) if len(key) else 0 for key in keys]
+    spans = [int(key.max()) - low + 1 if len(key) else 1 for key, low in zip(keys, lows)]
+    if spans[0] * spans[1] * spans[2] < 2 ** 62:
+        # Cas courant : les trois cases tiennent dans un seul entier, trié en une passe
+        packed = ((keys[0] - lows[0]) * spans[1] + (keys[1] - lows[1])) * spans[2] + (keys[2] - lows[2])
+        del keys
+        order = np.argsort(packed)
+        start = np.ones(len(order), dtype=bool)
+        sorted_keys = packed[order]
+        start[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        del sorted_keys
+    else:
+        order = np.lexsort(keys[::-1])
+        start = np.ones(len(order), dtype=bool)
+        for key in keys:
+            start[1:] &= key[order[1:]] == key[order[:-1]]
+        start[1:] = ~start[1:]
+    inverse = np.empty(len(order), dtype=np.int64)
+    inverse[order] = np.cumsum(start) - 1
+    return order[start], inverse
+
+
+def face_cross(vertices, faces):
+    # Produits vectoriels (F, 3) des faces
+    a = vertices[faces[:, 0]]
+    return row_cross(vertices[faces[:, 1]] - a, vertices[faces[:, 2]] - a)
+
+
+def run_lengths(keys):
+    # Nombre d'occurrences de chaque valeur distincte (comme np.unique, sans son tri stable)
+    keys = np.sort(keys)
+    if not len(keys):
+        return keys
+    bounds = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1], [True])))
+    return np.diff(bounds)
+
+
+def edge_report(faces, num_vertices):
+    # Arêtes non orientées (paire d'indices triée, codée en un entier) comptées avec np.unique :
+    # 1 face = bord, plus de 2 = non manifold. Une arête orientée vue deux fois trahit deux
+    # faces voisines d'orientations opposées
+    starts = faces.ravel().astype(np.int64)
+    ends = np.roll(faces, -1, axis=1).ravel().astype(np.int64)
+    counts = run_lengths(np.minimum(starts, ends) * num_vertices + np.maximum(starts, ends))
+    directed_counts = run_lengths(starts * num_vertices + ends)
+    return {
+        'edges': len(counts),
+        'boundary_edges': int((counts == 1).sum()),
+        'non_manifold_edges': int((counts > 2).sum()),
+        'inconsistent_edges': int((directed_counts > 1).sum())
+    }
+
+
+def components(count, first, second):
+    # Composante connexe de chaque nœud du graphe d'arêtes first[i]-second[i], étiquetée par
+    # son plus petit indice : les racines s'accrochent à la plus petite étiquette voisine, puis
+    # les pointeurs sont raccourcis jusqu'aux racines. Quelques passes suffisent en pratique
+    labels = np.arange(count)
+    while len(first):
+        low, high = labels[first], labels[second]
+        differ = low != high
+        first, second = first[differ], second[differ]
+        low, high = low[differ], high[differ]
+        np.minimum.at(labels, np.maximum(low, high), np.minimum(low, high))
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    return labels
+
+
+def orient(faces, num_vertices):
+    # Orientation cohérente dans chaque composante connexe : (faces à retourner, composante
+    # de chaque face, faces touchant un bord ou une arête non manifold). Chaque face a deux
+    # états (gardée, retournée) ; deux faces partageant une arête dans le même sens doivent
+    # avoir des états opposés. Les composantes du graphe des états vont par paires et
+    # celle de plus petite étiquette désigne les faces à retourner. Une composante non
+    # orientable (ruban de Möbius) garde ses deux états ensemble et n'est pas touchée
+    if not len(faces):
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+    starts = faces.ravel().astype(np.int64)
+    ends = np.roll(faces, -1, axis=1).ravel().astype(np.int64)
+    keys = np.minimum(starts, ends) * num_vertices + np.maximum(starts, ends)
+    order = np.argsort(keys)
+    keys = keys[order]
+    bounds = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1], [True])))
+    del keys
+    lengths = np.diff(bounds)
+    pair = bounds[:-1][lengths == 2]
+    one, two = order[pair], order[pair + 1]
+    same = ((starts[one] < ends[one]) == (starts[two] < ends[two])).astype(np.int64)
+    one, two = one // 3, two // 3
+    opened = np.zeros(len(faces), dtype=bool)
+    opened[order[np.repeat(lengths != 2, lengths)] // 3] = True
+    del starts, ends, order
+    if not same.any():
+        # Cas courant, orientation déjà cohérente : les deux moitiés du graphe des états
+        # sont identiques, une seule suffit
+        return np.zeros(len(faces), dtype=bool), components(len(faces), one, two), opened
+    one, two = one * 2, two * 2
+    labels = components(2 * len(faces), np.concatenate((one, one + 1)),
+                        np.concatenate((two + same, two + 1 - same)))
+    kept, turned = labels[0::2], labels[1::2]
+    return turned < kept, np.minimum(kept, turned), opened
+
+
+def repair(triangles, tolerance=WELD_TOLERANCE):
+    # Renvoie (sommets, faces) réparés et le rapport de ce qui a été corrigé
+    report = {'triangles': len(triangles)}
+    with stage('weld', triangles=len(triangles)):
+        vertices, faces = weld(triangles, tolerance)
+    report['vertices'] = len(vertices)
+
+    with stage('degenerate', triangles=len(faces)):
+        # Deux sommets soudés ensemble, ou aire nulle (triangle plat) ; les non finis aussi
+        collapsed = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 2] == faces[:, 0])
+        cross = face_cross(vertices, faces)
+        areas = 0.5 * np.sqrt(np.einsum('ij,ij->i', cross, cross))
+        degenerate = collapsed | ~(areas > DEGENERATE_AREA)
+        faces, cross = faces[~degenerate], cross[~degenerate]
+    report['degenerate_removed'] = int(degenerate.sum())
+
+    with stage('duplicates', triangles=len(faces)):
+        # Même triplet de sommets quel que soit l'ordre : on garde la première face
+        triples = np.sort(faces, axis=1).astype(np.int64)
+        count = len(vertices)
+        if count ** 3 < 2 ** 62:
+            keys = (triples[:, 0] * count + triples[:, 1]) * count + triples[:, 2]
+            order = np.argsort(keys)
+            same = keys[order[1:]] == keys[order[:-1]]
+        else:
+            pair = triples[:, 0] * count + triples[:, 1]
+            order = np.lexsort((triples[:, 2], pair))
+            same = (pair[order[1:]] == pair[order[:-1]]) & (triples[order[1:], 2] == triples[order[:-1], 2])
+        repeated = np.zeros(len(faces), dtype=bool)
+        repeated[order[1:]] = same
+        faces, cross = faces[~repeated], cross[~repeated]
+    report['duplicates_removed'] = int(repeated.sum())
+
+    with stage('edges', triangles=len(faces)):
+        report.update(edge_report(faces, len(vertices)))
+
+    with stage('orientation', triangles=len(faces)):
+        flip, component, opened = orient(faces, len(vertices))
+        # Puis, par composante fermée : volume négatif = tournée vers l'intérieur, retournée entière
+        volumes = np.einsum('ij,ij->i', vertices[faces[:, 0]], cross)
+        volumes = np.bincount(component, weights=np.where(flip, -volumes, volumes), minlength=2 * len(faces))
+        closed = np.bincount(component[opened], minlength=2 * len(faces)) == 0
+        flip ^= ((volumes < 0) & closed)[component]
+        faces = np.where(flip[:, None], faces[:, ::-1], faces)
+    report['flipped'] = int(flip.sum())
+    inconsistent = report['inconsistent_edges']
+    if report['flipped']:
+        inconsistent = edge_report(faces, len(vertices))['inconsistent_edges']
+    report['watertight'] = (report['boundary_edges'] == 0 and report['non_manifold_edges'] == 0
+                            and inconsistent == 0)
+    report['output_triangles'] = len(faces)
+    return vertices, faces, report
+
+
+def to_triangles(vertices, faces):
+    # Tableau Mesh.dtype, normales recalculées depuis l'orientation des faces
+    data = np.zeros(len(faces), dtype=stlmesh.Mesh.dtype)
+    with stage('normals', triangles=len(faces)):
+        triangles = np.asarray(vertices, dtype=np.float32)[faces]
+        data['vectors'] = triangles
+        data['normals'] = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    return data
+
+
+def repair_mesh(data, tolerance=WELD_TOLERANCE):
+    # Triangles Mesh.dtype réparés et rapport
+    vertices, faces, report = repair(data['vectors'], tolerance)
+    return to_triangles(vertices, faces), report
+
+
+def format_report(report):
+    lines = [f"  triangles   : {report['triangles']} -> {report['output_triangles']}",
+             f"  sommets     : {report['vertices']} après soudure",
+             f"  dégénérés   : {report['degenerate_removed']} retirés",
+             f"  doublons    : {report['duplicates_removed']} retirés",
+             f"  bords       : {report['boundary_edges']} arêtes",
+             f"  non manifold: {report['non_manifold_edges']} arêtes",
+             f"  orientation : {report['inconsistent_edges']} arêtes incohérentes"
+             + (f", {report['flipped']} faces retournées" if report['flipped'] else ""),
+             "  étanche     : " + ("oui" if report['watertight'] else "non")]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vérifie et répare un STL binaire existant.")
+    parser.add_argument('input', help="STL binaire à vérifier")
+    parser.add_argument('output', nargs='?', help="STL réparé (sans lui, simple vérification)")
+    parser.add_argument('--tolerance', type=float, default=WELD_TOLERANCE, help="Distance de soudure des sommets (mm)")
+    parser.add_argument('--json', action='store_true', help="Rapport en JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        name, data = map_stl(args.input)
+        repaired, report = repair_mesh(data, args.tolerance)
+        if args.output:
+            save_stream(args.output, split(repaired), name)
+    except (OSError, ValueError) as error:
+        # STL ASCII, tronqué ou illisible : distinct d'une plaque non étanche
+        print(error, file=sys.stderr)
+        return 2
+    print(json.dumps(report) if args.json else f"{args.input}\n{format_report(report)}")
+    return 0 if report['watertight'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
@@ -1,20 +1,150 @@
 import sys
-import math
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QFormLayout, QLabel, QLineEdit, QPushButton, QProgressBar, QComboBox
+import time
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QFormLayout, QLabel, QLineEdit, QPushButton, QProgressBar, QComboBox, QMessageBox, QCheckBox
 from PyQt5.QtGui import QFont, QColor, QPalette
 from pyqtgraph.Qt import QtCore
-import numpy as np
-from stl import mesh as stlmesh
 import os
 import shutil
 import pyqtgraph.opengl as gl
-from shapes import Hexagon, Circle, Square, KochSnowflake
+from pyqtgraph import Vector
+from generator import SHAPES, filename_for, Cancelled
+from cache import MeshCache
+from incremental import Regenerator
+from preview import Preview
+import profiling
+
+class GenerationWorker(QtCore.QThread):
+    # Génère la plaque hors du fil de l'interface ; la progression est limitée
+    # à 30 mises à jour par seconde et l'annulation est vérifiée à chaque bande
+    progress = QtCore.pyqtSignal(int)
+    generated = QtCore.pyqtSignal(str, object, str, object, object, object)
+    failed = QtCore.pyqtSignal(str)
+
+    MAX_UPDATES_PER_SECOND = 30
+
+    def __init__(self, shape, parameters, stl_file_name, regenerator, parent=None):
+        super().__init__(parent)
+        self.shape = shape
+        self.parameters = parameters
+        self.stl_file_name = stl_file_name
+        self.regenerator = regenerator
+        self.cancelled = False
+        self.last_update = 0.0
+
+    def cancel(self):
+        self.cancelled = True
+
+    def report(self, done, total):
+        if self.cancelled:
+            raise Cancelled()
+        now = time.monotonic()
+        if done == total or now - self.last_update >= 1 / self.MAX_UPDATES_PER_SECOND:
+            self.last_update = now
+            # La génération compte pour 90 %, l'aperçu du visualiseur pour le reste
+            self.progress.emit(int(90 * done / max(total, 1)))
+
+    def written(self):
+        # Identité du fichier de sortie (None s'il n'existe pas) : un fichier déjà présent
+        # et inchangé à l'annulation appartient à une sauvegarde précédente
+        try:
+            status = os.stat(self.stl_file_name)
+        except OSError:
+            return None
+        return status.st_ino, status.st_size, status.st_mtime_ns
+
+    def run(self):
+        before = self.written()
+        try:
+            with profiling.stage('save', shape=self.shape):
+                self.regenerator.save(self.shape, self.parameters, self.stl_file_name, progress=self.report)
+            if self.cancelled:
+                return
+            with profiling.stage('preview', shape=self.shape):
+                preview = Preview(self.shape, self.parameters)
+                detail = preview.detail()
+                points = preview.stand_in()
+        except Cancelled:
+            # Un fichier à moitié écrit ne doit pas rester sur le disque, mais seulement
+            # s'il vient de ce calcul : l'écriture n'a peut-être pas encore commencé
+            after = self.written()
+            if after is not None and after != before:
+                os.remove(self.stl_file_name)
+            return
+        except Exception as error:
+            # Toute erreur doit libérer la barre de progression et le bouton d'annulation
+            self.failed.emit(str(error) or type(error).__name__)
+            return
+        self.generated.emit(self.shape, self.parameters, self.stl_file_name, preview, detail, points)
+
+
+class PreviewWorker(QtCore.QThread):
+    # Aperçu en mémoire seulement, sans écriture de fichier : la zone détaillée est
+    # bornée par le budget de Preview. Une saisie plus récente rend le calcul caduc
+    ready = QtCore.pyqtSignal(str, object, object, object, object)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, shape, parameters, parent=None):
+        super().__init__(parent)
+        self.shape = shape
+        self.parameters = parameters
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled()
+
+    def run(self):
+        try:
+            with profiling.stage('preview', shape=self.shape):
+                preview = Preview(self.shape, self.parameters)
+                self.check()
+                detail = preview.detail()
+                self.check()
+                points = preview.stand_in()
+        except Cancelled:
+            return
+        except Exception as error:
+            self.failed.emit(str(error) or type(error).__name__)
+            return
+        self.ready.emit(self.shape, self.parameters, preview, detail, points)
+
+
+class PreviewWidget(gl.GLViewWidget):
+    # Signale chaque changement de vue (zoom, rotation, déplacement) pour recharger le détail
+    viewChanged = QtCore.pyqtSignal()
+
+    def wheelEvent(self, event):
+        super().wheelEvent(event)
+        self.viewChanged.emit()
+
+    def mouseReleaseEvent(self, event):
+        super().mouseReleaseEvent(event)
+        self.viewChanged.emit()
+
 
 class ShapeGenerator(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Générateur de formes")
         self.setGeometry(100, 100, 800, 600)
+        # Un jeu de paramètres déjà vu est relu depuis le cache au lieu d'être régénéré
+        self.cache = MeshCache()
+        # Seuls la hauteur ou la taille de plaque changent : delta sur le dernier résultat
+        self.regenerator = Regenerator(self.cache)
+        self.worker = None
+        self.preview_worker = None
+        # Calculs encore en cours, y compris ceux remplacés par une saisie plus récente
+        self.running = set()
+        self.preview = None
+        self.detail_item = None
+        self.last_generation = None
+        # Paramètres de l'aperçu affiché, pas encore écrits sur le disque
+        self.pending_save = None
+        # Instrumentation activée par STL_PATTERN_PROFILE, affichée dans la barre d'état
+        self.recorder = profiling.enable_from_environment()
         self.init_ui()
 
     def init_ui(self):
@@ -24,9 +154,20 @@ class ShapeGenerator(QMainWindow):
         main_layout.setContentsMargins(20, 20, 20, 20)
         main_layout.setSpacing(20)
         self.shape_selector = QComboBox()
-        self.shape_selector.addItems(["Hexagone", "Rond", "Carré", "Flocon de Koch"])
+        # Un choix par motif enregistré, dans l'ordre de déclaration
+        for name, pattern in SHAPES.items():
+            self.shape_selector.addItem(pattern.label, name)
         self.shape_selector.currentIndexChanged.connect(self.update_parameters_form)
         main_layout.addWidget(self.shape_selector)
+        # Aperçu automatique : chaque saisie relance un aperçu en mémoire après une pause
+        self.auto_preview = QCheckBox("Aperçu automatique")
+        self.auto_preview.setFont(QFont("Segoe UI", 12))
+        self.auto_preview.setChecked(True)
+        main_layout.addWidget(self.auto_preview)
+        self.preview_timer = QtCore.QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(400)
+        self.preview_timer.timeout.connect(self.start_preview)
         self.form_layout = QFormLayout()
         main_layout.addLayout(self.form_layout)
         self.init_parameters()
@@ -35,10 +176,21 @@ class ShapeGenerator(QMainWindow):
         self.progress_bar.setTextVisible(False)
         self.progress_bar.setHidden(True)
         main_layout.addWidget(self.progress_bar)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setFont(QFont("Segoe UI", 12))
+        self.cancel_button.setHidden(True)
+        self.cancel_button.clicked.connect(self.cancel_generation)
+        main_layout.addWidget(self.cancel_button)
         self.timer = QtCore.QTimer(self)
         self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.hide_progress_bar)
-        self.visualizer_widget = gl.GLViewWidget()
+        self.visualizer_widget = PreviewWidget()
+        self.visualizer_widget.viewChanged.connect(self.schedule_detail)
+        # Le détail n'est recalculé qu'une fois la vue immobile
+        self.detail_timer = QtCore.QTimer(self)
+        self.detail_timer.setSingleShot(True)
+        self.detail_timer.setInterval(150)
+        self.detail_timer.timeout.connect(self.refresh_detail)
         self.visualizer_widget.opts['distance'] = 100  # Réglez la distance de vue si nécessaire
         self.visualizer_widget.setBackgroundColor(53, 53, 53, 53)
         main_layout.addWidget(self.visualizer_widget)
@@ -52,7 +204,7 @@ class ShapeGenerator(QMainWindow):
         self.update_parameters_form()
 
     def update_parameters_form(self):
-        shape = self.shape_selector.currentText()
+        shape = self.shape_selector.currentData()
         self.form_layout.setRowWrapPolicy(QFormLayout.DontWrapRows)
         self.form_layout.setVerticalSpacing(10)
         self.form_layout.setHorizontalSpacing(10)
@@ -60,27 +212,17 @@ class ShapeGenerator(QMainWindow):
             child = self.form_layout.takeAt(0).widget()
             if child is not None:
                 child.deleteLater()
-        if shape == "Hexagone":
-            self.hex_size_entry = self.add_parameter("Taille des hexagones (mm):", "1.0")
-            self.hex_height_entry = self.add_parameter("Hauteur des hexagones (mm):", "1.0")
-            self.hex_spacing_entry = self.add_parameter("Espacement entre les hexagones (mm):", "0.25")
-        elif shape == "Rond":
-            self.round_radius_entry = self.add_parameter("Rayon du cercle (mm):", "1.0")
-            self.round_spacing_entry = self.add_parameter("Espacement entre les ronds (mm):", "1.0")
-        elif shape == "Flocon de Koch":
-            # Ajoutez les paramètres spécifiques au flocon de Koch
-            self.koch_side_length_entry = self.add_parameter("Longueur du côté du triangle (mm):", "1.0")
-            self.koch_iterations_entry = self.add_parameter("Nombre d'itérations:", "3")
-        elif shape == "Carré":
-            self.square_side_length_entry = self.add_parameter("Longueur du côté du carré (mm):", "1.0")
-            self.square_height_entry = self.add_parameter("Hauteur du carré (mm):", "1.0")
-            self.square_spacing_entry = self.add_parameter("Espacement entre les carrés (mm):", "0.25")
-        self.surface_width_entry = self.add_parameter("Largeur de la surface (mm):", "10.0")
-        self.surface_height_entry = self.add_parameter("Hauteur de la surface (mm):", "10.0")
+        # Formulaire construit depuis le schéma du motif : plaque de base et surface comprises
+        self.entries = {}
+        for param in SHAPES[shape].parameter_schema():
+            self.entries[param] = self.add_parameter(param.label + ":", str(param.default))
+        # Contour vide : la grille s'arrête aux cellules entières, sinon elle remplit le contour
+        self.outline_entry = self.add_parameter("Contour (rectangle, circle ou fichier):", "")
         self.generate_button = QPushButton("Preview STL")
         self.generate_button.setFont(QFont("Segoe UI", 12))
         self.generate_button.clicked.connect(self.generate_shape)
         self.form_layout.addRow(self.generate_button)
+        self.schedule_preview()
 
     def add_parameter(self, label_text, default_value):
         font = QFont("Segoe UI", 12)
@@ -88,211 +230,138 @@ class ShapeGenerator(QMainWindow):
         label.setFont(font)
         entry = QLineEdit(default_value)
         entry.setFont(font)
+        entry.textEdited.connect(self.schedule_preview)
         self.form_layout.addRow(label, entry)
         return entry
 
     def generate_shape(self):
+        try:
+            shape, parameters, filename = self.current_parameters()
+        except ValueError as error:
+            # Une exception non rattrapée dans un slot PyQt5 arrête l'application
+            self.statusBar().showMessage(f"Saisie invalide : {error}")
+            return
         self.clear_visualizer()
-        shape = self.shape_selector.currentText()
-        if shape == "Hexagone":
-            self.generate_honeycomb_grid("hexagon.stl")
-        elif shape == "Rond":
-            self.generate_round_shape("rond.stl")
-        elif shape == "Carré":
-            self.generate_square("carre.stl")
-        elif shape == "Flocon de Koch":
-            self.generate_koch_snowflake("koch_snowflake.stl")
+        self.start_generation(shape, parameters, filename)
+
+    def current_parameters(self):
+        # (forme, paramètres, fichier) lus dans le formulaire ; ValueError si une saisie est invalide
+        shape = self.shape_selector.currentData()
+        parameters = {param.key: param.type(entry.text()) for param, entry in self.entries.items()}
+        filename = SHAPES[shape].filename
+        outline = self.outline_entry.text().strip()
+        if outline:
+            parameters = {**parameters, 'outline': outline, 'fill': True}
+        return shape, parameters, filename
 
     def clear_visualizer(self):
         self.visualizer_widget.clear()
+        self.preview = None
+        self.detail_item = None
+
+    def schedule_preview(self):
+        # Chaque saisie repousse l'aperçu : seul le dernier état du formulaire est calculé
+        if self.auto_preview.isChecked():
+            self.preview_timer.start()
+
+    def start_preview(self):
+        try:
+            shape, parameters, _ = self.current_parameters()
+        except ValueError:
+            # Saisie en cours (champ vide, nombre incomplet) : on attend la suivante
+            return
+        if self.preview_worker is not None:
+            # Le calcul remplacé s'arrête à sa prochaine étape ; ses signaux seront ignorés
+            self.preview_worker.cancel()
+        self.preview_worker = PreviewWorker(shape, parameters, self)
+        self.preview_worker.ready.connect(self.preview_ready)
+        self.preview_worker.failed.connect(self.preview_failed)
+        self.launch(self.preview_worker)
+
+    def launch(self, worker):
+        # Un calcul terminé est détruit par Qt au lieu de rester enfant de la fenêtre
+        self.running.add(worker)
+        worker.finished.connect(self.worker_finished)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+
+    def worker_finished(self):
+        self.running.discard(self.sender())
+
+    def preview_ready(self, shape, parameters, preview, detail, points):
+        if self.sender() is not self.preview_worker:
+            return
+        self.preview_worker = None
+        self.visualize(preview, detail, points)
+        # La plaque complète n'est écrite que sur « Save File »
+        self.pending_save = (shape, parameters)
+        self.rename_button.setHidden(False)
 
-    def generate_honeycomb_grid(self, filename):
-        self.progress_bar.setHidden(False)
-        self.generate_button.setEnabled(False)
-
-        size = float(self.hex_size_entry.text())
-        height = float(self.hex_height_entry.text())
-        spacing = float(self.hex_spacing_entry.text())
-        surface_width_mm = float(self.surface_width_entry.text())
-        surface_height_mm = float(self.surface_height_entry.text())
-        surface_width = int(surface_width_mm / (math.sqrt(3) * size + spacing))
-        surface_height = int(surface_height_mm / (1.5 * size + spacing))
-
-        horiz = math.sqrt(3) * size + spacing
-        vert = 1.5 * size + spacing
-
-        all_hexagons = []
-        total_hexagons = surface_height * surface_width
-        progress_step = 100 / total_hexagons
-        current_progress = 0
-
-        for i in range(surface_height):
-            for j in range(surface_width):
-                if j * horiz >= surface_width_mm or i * vert >= surface_height_mm:
-                    break
-                x = j * horiz + (i % 2) * (horiz / 2)
-                y = i * vert
-                hexagon = self.create_hexagon(size, height)
-
-                rotation_angle = 0
-                if i % 2 == 0:
-                    rotation_angle = 30 if j % 2 == 0 else -30
-                else:
-                    rotation_angle = 30 if j % 2 != 0 else -30
-
-                hexagon.rotate([0, 0, 1], math.radians(rotation_angle))
-                hexagon.translate([x, y, 0])
-                all_hexagons.append(hexagon)
-
-                current_progress += progress_step
-                self.progress_bar.setValue(int(current_progress))
-
-        combined_hexagons = stlmesh.Mesh(np.concatenate([h.data for h in all_hexagons]))
-        stl_file_name = os.path.abspath(filename)
-        combined_hexagons.save(stl_file_name)
-
-        self.timer.start(500)
-        self.visualize_stl(stl_file_name)
-    def generate_round_shape(self, filename):
+    def preview_failed(self, message):
+        if self.sender() is not self.preview_worker:
+            return
+        self.preview_worker = None
+        self.statusBar().showMessage(message)
+
+    def start_generation(self, shape, parameters, filename):
+        # Une nouvelle demande remplace celle en cours : l'ancienne s'arrête à la
+        # fin de sa bande courante avant que la nouvelle n'écrive le même fichier
+        self.cancel_generation()
+        self.timer.stop()
+        self.rename_button.setHidden(True)
+        self.progress_bar.setValue(0)
         self.progress_bar.setHidden(False)
-        self.generate_button.setEnabled(False)
-        radius = float(self.round_radius_entry.text())
-        spacing = float(self.round_spacing_entry.text())
-        surface_width_mm = float(self.surface_width_entry.text())
-        surface_height_mm = float(self.surface_height_entry.text())
-        num_circles = int(surface_width_mm / (2 * radius + spacing))
-        num_vertical_circles = int(surface_height_mm / (2 * radius + spacing))
-        all_circles = []
-        total_circles = num_circles * num_vertical_circles
-        progress_step = 100 / total_circles
-        current_progress = 0
-        for i in range(num_vertical_circles):
-            center_y = radius + i * (2 * radius + spacing)
-            for j in range(num_circles):
-                center_x = radius + j * (2 * radius + spacing)
-                circle = self.create_circle(radius, 30, center_x, center_y)
-                all_circles.append(circle)
-                current_progress += progress_step
-                self.progress_bar.setValue(int(current_progress))
-        combined_circles = stlmesh.Mesh(np.concatenate([c.data for c in all_circles]))
-        stl_file_name = os.path.abspath(filename)
-        combined_circles.save(stl_file_name)
+        self.cancel_button.setHidden(False)
+
+        if self.recorder:
+            self.recorder.clear()
+        self.worker = GenerationWorker(shape, parameters, os.path.abspath(filename), self.regenerator, self)
+        self.worker.progress.connect(self.progress_bar.setValue)
+        self.worker.generated.connect(self.generation_done)
+        self.worker.failed.connect(self.generation_failed)
+        self.launch(self.worker)
+
+    def cancel_generation(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.wait()
+            self.worker = None
+            self.progress_bar.setHidden(True)
+            self.cancel_button.setHidden(True)
+
+    def closeEvent(self, event):
+        # Un QThread détruit en cours d'exécution ferait planter l'application
+        self.preview_timer.stop()
+        self.cancel_generation()
+        for worker in list(self.running):
+            worker.cancel()
+            worker.wait()
+        super().closeEvent(event)
+
+    def generation_done(self, shape, parameters, stl_file_name, preview, detail, points):
+        # Les signaux d'un calcul remplacé peuvent encore arriver : on les ignore
+        if self.sender() is not self.worker:
+            return
+        self.worker = None
+        self.last_generation = (shape, parameters, stl_file_name)
+        self.pending_save = None
+        self.progress_bar.setValue(100)
+        self.cancel_button.setHidden(True)
         self.timer.start(500)
-        self.visualize_stl(stl_file_name)
-
-    def generate_koch_snowflake(self, filename):
-        # Récupérez les paramètres du formulaire
-        side_length = float(self.koch_side_length_entry.text())
-        iterations = int(self.koch_iterations_entry.text())
-        surface_width_mm = float(self.surface_width_entry.text())
-        surface_height_mm = float(self.surface_height_entry.text())
-
-        # Divisez la surface en régions plus petites
-        region_width = side_length * 3  # Largeur d'une région
-        region_height = side_length * np.sqrt(3)  # Hauteur d'une région
-        num_regions_x = int(surface_width_mm / region_width)
-        num_regions_y = int(surface_height_mm / region_height)
-
-        # Générez un flocon de Koch sur chaque région
-        all_meshes = []
-        for y in range(num_regions_y):
-            for x in range(num_regions_x):
-                # Calculez les coordonnées de départ de la région
-                region_x = x * region_width
-                region_y = y * region_height
-
-                # Génère le flocon de Koch pour cette région
-                koch_snowflake = KochSnowflake({'side_length': side_length, 'iterations': iterations})
-                mesh = koch_snowflake.generate_mesh()
-
-                # Déplace le maillage pour qu'il corresponde à la région actuelle
-                mesh.x += region_x
-                mesh.y += region_y
-
-                # Ajoute le maillage à la liste des maillages
-                all_meshes.append(mesh)
-
-        # Combinez tous les maillages en un seul maillage
-        combined_mesh = stlmesh.Mesh(np.concatenate([m.data for m in all_meshes]))
-
-        # Enregistrez le maillage dans un fichier STL
-        stl_file_name = os.path.abspath(filename)
-        combined_mesh.save(stl_file_name)
-
-        # Affichez le maillage dans le visualiseur
-        self.timer.start(500)
-        self.visualize_stl(stl_file_name)
-
-    def generate_square(self, filename):
-        side_length = float(self.square_side_length_entry.text())
-        height = float(self.square_height_entry.text())
-        spacing = float(self.square_spacing_entry.text())
-        surface_width_mm = float(self.surface_width_entry.text())
-        surface_height_mm = float(self.surface_height_entry.text())
-
-        parameters = {
-            'side_length': side_length,
-            'height': height,
-            'spacing': spacing,
-            'width': surface_width_mm,
-            'height_dimension': surface_height_mm
-        }
-        square = Square(parameters)
-        mesh = square.generate_mesh()
-        stl_file_name = os.path.abspath(filename)
-        mesh.save(stl_file_name)
-
-        self.timer.start(500)
-        self.visualize_stl(stl_file_name)
-
-    def create_hexagon(self, edge_length, height):
-        angle_deg = 60
-        points_2d = [(math.cos(math.radians(angle * angle_deg)), math.sin(math.radians(angle * angle_deg)))
-                     for angle in range(6)]
-
-        vertices = np.zeros((12, 3))
-        for i in range(6):
-            vertices[i, :2] = [p * edge_length for p in points_2d[i]]
-            vertices[i + 6] = [vertices[i, 0], vertices[i, 1], height]
-
-        faces = []
-        for i in range(6):
-            faces.append([i, (i + 1) % 6, i + 6])
-            faces.append([(i + 1) % 6, (i + 1) % 6 + 6, i + 6])
-        for i in range(1, 5):
-            faces.append([0, i, i + 1])
-            faces.append([6, i + 6, i + 1 + 6])
-
-        hexagon = stlmesh.Mesh(np.zeros(len(faces), dtype=stlmesh.Mesh.dtype))
-        for i, f in enumerate(faces):
-            hexagon.vectors[i] = vertices[f]
-
-        return hexagon
-
-    def create_circle(self, radius, num_points, center_x, center_y):
-        theta = np.linspace(0, 2 * np.pi, num_points, endpoint=False)
-        x = center_x + radius * np.cos(theta)
-        y = center_y + radius * np.sin(theta)
-        vertices_base = np.zeros((num_points + 1, 3))
-        vertices_base[0, :] = [center_x, center_y, 0]
-        vertices_base[1:, 0] = x
-        vertices_base[1:, 1] = y
-        vertices_top = np.zeros_like(vertices_base)
-        vertices_top[:, :2] = vertices_base[:, :2]
-        vertices_top[:, 2] = 1.0
-        vertices = np.vstack([vertices_base, vertices_top])
-        faces_base = [[0, i, (i % num_points) + 1] for i in range(1, num_points + 1)]
-        faces_top = [[num_points + 1, num_points + i + 1, num_points + (i % num_points) + 2] for i in range(1, num_points + 1)]
-        faces_side = []
-        for i in range(1, num_points + 1):
-            next_index = (i % num_points) + 1
-            faces_side.append([i, next_index, num_points + next_index])
-            faces_side.append([num_points + next_index, num_points + i, i])
-        all_faces = faces_base + faces_top + faces_side
-        circle_mesh = stlmesh.Mesh(np.zeros(len(all_faces), dtype=stlmesh.Mesh.dtype))
-        for i, f in enumerate(all_faces):
-            circle_mesh.vectors[i] = vertices[f]
-        return circle_mesh
+        self.visualize(preview, detail, points)
+        if self.recorder:
+            self.statusBar().showMessage(self.recorder.format())
+            trace = profiling.trace_path_from_environment()
+            if trace:
+                self.recorder.save_trace(trace)
+
+    def generation_failed(self, message):
+        if self.sender() is not self.worker:
+            return
+        self.worker = None
+        self.progress_bar.setHidden(True)
+        self.cancel_button.setHidden(True)
+        QMessageBox.warning(self, "Erreur de génération", message)
 
     def hide_progress_bar(self):
         self.progress_bar.setHidden(True)
@@ -300,22 +369,45 @@ class ShapeGenerator(QMainWindow):
         self.rename_button.setHidden(False)
 
     def rename_stl_file(self):
-        surface_width = self.form_layout.itemAt(6).widget().text()
-        surface_height = self.form_layout.itemAt(8).widget().text()
-        size = self.form_layout.itemAt(0).widget().text()
-        height = self.form_layout.itemAt(2).widget().text()
-        spacing = self.form_layout.itemAt(4).widget().text()
-        stl_file_name = self.shape_selector.currentText().lower() + ".stl"
-        new_stl_file_name = os.path.join(os.path.dirname(stl_file_name), f"honeycomb_grid_surface_{surface_width}x{surface_height}_size_{size}_height_{height}_spacing_{spacing}_hex_size_{size}.stl")
+        if self.pending_save is not None:
+            # Aperçu seul : la plaque complète est générée directement sous son nom définitif
+            shape, parameters = self.pending_save
+            self.rename_button.setHidden(True)
+            self.start_generation(shape, parameters, filename_for(shape, parameters))
+            return
+        # Le nouveau nom reprend les paramètres réellement utilisés pour la génération
+        shape, parameters, stl_file_name = self.last_generation
+        new_stl_file_name = os.path.join(os.path.dirname(stl_file_name), filename_for(shape, parameters))
         shutil.move(stl_file_name, new_stl_file_name)
         self.rename_button.setHidden(True)
 
-    def visualize_stl(self, stl_file):
-        mesh = stlmesh.Mesh.from_file(stl_file)
-        vertices = mesh.vectors.reshape(-1, 3)
-        faces = np.arange(len(vertices)).reshape(-1, 3)
-        self.visualizer_widget.addItem(gl.GLMeshItem(vertexes=vertices, faces=faces, smooth=True, color=(0, 0, 1, 1)))
-
+    def visualize(self, preview, detail, points):
+        # Aperçu à niveaux de détail, construit directement depuis les tableaux en mémoire :
+        # un point par cellule pour toute la plaque, et un maillage indexé pour la zone centrale
+        self.clear_visualizer()
+        self.preview = preview
+        if not preview.complete():
+            self.visualizer_widget.addItem(gl.GLScatterPlotItem(pos=points, size=2, color=(0, 0, 1, 1), pxMode=True))
+        vertices, faces = detail
+        with profiling.stage('upload', triangles=len(faces), bytes=vertices.nbytes + faces.nbytes):
+            self.detail_item = gl.GLMeshItem(vertexes=vertices, faces=faces, smooth=False, color=(0, 0, 1, 1))
+            self.visualizer_widget.addItem(self.detail_item)
+
+        xmin, ymin, xmax, ymax = preview.extent()
+        self.visualizer_widget.setCameraPosition(pos=Vector((xmin + xmax) / 2, (ymin + ymax) / 2, 0),
+                                                 distance=max(xmax - xmin, ymax - ymin, 1) * 1.5)
+
+    def schedule_detail(self):
+        if self.preview is not None:
+            self.detail_timer.start()
+
+    def refresh_detail(self):
+        # Recharge le détail autour du point visé ; inutile si toute la plaque tient dans le budget
+        if self.preview is None or self.detail_item is None or self.preview.complete():
+            return
+        center = self.visualizer_widget.opts['center']
+        vertices, faces = self.preview.detail((center.x(), center.y()))
+        self.detail_item.setMeshData(vertexes=vertices, faces=faces, smooth=False, color=(0, 0, 1, 1))
 
 
 if __name__ == "__main__":
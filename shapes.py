@@ -1,163 +1,597 @@
 import numpy as np
 import math
-from stl import mesh as stlmesh
-from concurrent.futures import ProcessPoolExecutor
-from multiprocessing import cpu_count
-
-def create_hexagon(size, height):
-    angle_deg = 60
-    angles = np.radians(np.arange(0, 360, angle_deg))
-    points = np.stack((np.cos(angles), np.sin(angles)), axis=-1) * size
-    vertices = np.vstack((points, points + [0, 0, height]))
-    faces = [[i, (i + 1) % 6, i + 6] for i in range(6)] + \
-            [[(i + 1) % 6, (i + 1) % 6 + 6, i + 6] for i in range(6)]
-    return vertices, np.array(faces)
-
-def create_circle(radius, height, num_points):
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+from tiling import fan, index, triangulate, rect_lattice, hex_lattice, tri_lattice, tile, tile_options, bands, tile_indexed, indexed_bands
+from export import save_stream, save_ply
+from profiling import stage
+from clipping import INSIDE, BOUNDARY, BinGrid, clip_cells, contained, ear_clip, load_outline, signed_area
+
+def triangle_outline(side_length):
+    # Triangle équilatéral pointe en haut, centré sur son centre de gravité, dans le sens direct
+    angles = np.radians([90, 210, 330])
+    return np.column_stack((np.cos(angles), np.sin(angles))) * side_length / np.sqrt(3)
+
+def hexagon_outline(size):
+    # Hexagone régulier pointe en haut, dans le sens direct
+    angles = np.radians(np.arange(30, 390, 60))
+    return np.column_stack((np.cos(angles), np.sin(angles))) * size
+
+# Écart maximal toléré entre l'arc et sa corde, et plus petit détail que l'imprimante reproduit (mm)
+CHORD_TOLERANCE = 0.01
+PRINTER_RESOLUTION = 0.05
+MIN_SEGMENTS = 8
+
+@lru_cache(maxsize=None)
+def circle_segments(radius, tolerance=CHORD_TOLERANCE, resolution=PRINTER_RESOLUTION):
+    # Juste assez de segments pour que la flèche r(1 - cos(π/n)) reste sous la tolérance,
+    # sans descendre sous des segments plus courts que la résolution de l'imprimante
+    if radius <= tolerance:
+        return MIN_SEGMENTS
+    segments = math.ceil(math.pi / math.acos(1 - tolerance / radius))
+    if resolution < 2 * radius:
+        segments = min(segments, math.floor(math.pi / math.asin(resolution / (2 * radius))))
+    return max(MIN_SEGMENTS, segments)
+
+def circle_outline(radius, num_points):
     theta = np.linspace(0, 2 * np.pi, num_points, endpoint=False)
-    points = np.stack((np.cos(theta), np.sin(theta)), axis=-1) * radius
-    vertices = np.vstack((points, points + [0, 0, height]))
-    faces = [[i, (i + 1) % num_points, num_points + (i + 1) % num_points, num_points + i] for i in range(num_points)]
-    return vertices, np.array(faces)
-
-def mesh_worker(params):
-    shape, x_offset, y_offset = params
-    try:
-        return shape.generate_mesh(), x_offset, y_offset
-    except Exception as e:
-        return None, x_offset, y_offset
-
-class Hexagon:
-    def __init__(self, parameters):
-        self.parameters = parameters
+    return np.column_stack((np.cos(theta), np.sin(theta))) * radius
 
-    def generate_mesh(self):
-        horiz = math.sqrt(3) * self.parameters['size'] + self.parameters['spacing']
-        vert = 1.5 * self.parameters['size'] + self.parameters['spacing']
-        num_x = self.parameters['width'] // horiz
-        num_y = self.parameters['height_dimension'] // vert
-
-        with ProcessPoolExecutor(max_workers=max(1, cpu_count() // 2)) as executor:
-            mesh_data = []
-            batch_size = 10  # Nombre de tâches à créer et exécuter à la fois
-            for y in range(0, num_y, batch_size):
-                for x in range(0, num_x, batch_size):
-                    tasks = []
-                    for j in range(batch_size):
-                        for i in range(batch_size):
-                            if y + j < num_y and x + i < num_x:
-                                tasks.append((self, (x + i) * horiz + ((y + j) % 2) * (horiz / 2), (y + j) * vert))
-                    mesh_data.extend(executor.map(mesh_worker, tasks))
-
-        return stlmesh.Mesh(np.concatenate([data[0] for data in mesh_data if data[0] is not None]),
-                            remove_empty_areas=False)
-
-
-class Circle:
-    def __init__(self, parameters):
-        self.parameters = parameters
+def rectangle_outline(x0, y0, x1, y1):
+    return np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype=float)
+
+def extrude(outline, height):
+    # Prisme fermé sur un contour convexe (P, 2) dans le sens direct : dessous et
+    # dessus en éventail, murs en deux triangles, toutes les normales vers l'extérieur
+    count = len(outline)
+    ring = np.arange(count)
+    following = (ring + 1) % count
+    inner = ring[1:-1]
+    vertices = np.vstack((np.column_stack((outline, np.zeros(count))),
+                          np.column_stack((outline, np.full(count, height)))))
+    faces = np.vstack((
+        np.column_stack((np.zeros_like(inner), inner + 1, inner)),
+        np.column_stack((np.full_like(inner, count), count + inner, count + inner + 1)),
+        np.column_stack((ring, following, count + following)),
+        np.column_stack((ring, count + following, count + ring))
+    ))
+    return vertices, faces
+
+def zipper(inner, outer):
+    # Triangule l'anneau entre deux contours concentriques (sens direct) en avançant
+    # par angle croissant, normales vers le haut ; indices : inner puis outer à la suite
+    center = inner.mean(axis=0)
+    start = math.atan2(*(inner[0] - center)[::-1])
+    # Un angle à 2π près de l'arrondi est ramené à 0 : coins alignés avec le départ
+    inner_angles = (np.arctan2(*(inner - center).T[::-1]) - start) % (2 * np.pi)
+    outer_angles = (np.arctan2(*(outer - center).T[::-1]) - start) % (2 * np.pi)
+    inner_angles[inner_angles > 2 * np.pi - 1e-9] = 0
+    outer_angles[outer_angles > 2 * np.pi - 1e-9] = 0
+    first = int(np.argmin(outer_angles))
+    outer_order = np.roll(np.arange(len(outer)), -first)
+    inner_angles = np.append(inner_angles, 2 * np.pi)
+    outer_angles = np.append(outer_angles[outer_order], outer_angles[outer_order[0]] + 2 * np.pi)
+
+    faces = []
+    i = j = 0
+    while i < len(inner) or j < len(outer):
+        a, b = i % len(inner), len(inner) + outer_order[j % len(outer)]
+        if j == len(outer) or (i < len(inner) and inner_angles[i + 1] <= outer_angles[j + 1]):
+            faces.append([a, b, (i + 1) % len(inner)])
+            i += 1
+        else:
+            faces.append([a, b, len(inner) + outer_order[(j + 1) % len(outer)]])
+            j += 1
+    return np.array(faces)
+
+def fuse(outline, height, tile_outline):
+    # Cellule soudée à sa part de plaque : dessus et murs de la cellule, anneau de sol
+    # entre la cellule et sa tuile. Les tuiles voisines partagent leurs arêtes ; le
+    # dessous de la plaque et ses murs sont ajoutés une seule fois par plate_walls
+    count, tiles = len(outline), len(tile_outline)
+    vertices, faces = extrude(outline, height)
+    # Sans le dessous de la cellule, qui serait interne à la plaque
+    faces = faces[count - 2:]
+    ground = zipper(outline, tile_outline)
+    ground = np.where(ground < count, ground, ground + count)
+    vertices = np.vstack((vertices, np.column_stack((tile_outline, np.zeros(tiles)))))
+    return vertices, np.vstack((faces, ground))
+
+def placed_outlines(outline, offsets, angles=None):
+    # Contours (N, K, 2) des cellules, tournés puis décalés exactement comme tiling.place
+    outline = np.asarray(outline, dtype=float)
+    if angles is None:
+        return offsets[:, None, :] + outline[None]
+    cos, sin = np.cos(angles)[:, None], np.sin(angles)[:, None]
+    return np.stack((cos * outline[:, 0] - sin * outline[:, 1] + offsets[:, :1],
+                     sin * outline[:, 0] + cos * outline[:, 1] + offsets[:, 1:]), axis=-1)
+
+def plate_walls(tile_outline, offsets, num_x, num_y, thickness, angles=None):
+    # Murs extérieurs et dessous de la plaque : arêtes de tuile des cellules du bord qui
+    # n'appartiennent à aucune autre tuile, descendues de z=0 à z=-thickness, puis le
+    # contour ainsi formé triangulé d'un seul tenant à z=-thickness
+    rows, cols = np.divmod(np.arange(len(offsets)), max(num_x, 1))
+    near = (rows < 2) | (rows >= num_y - 2) | (cols < 2) | (cols >= num_x - 2)
+    edge = (rows == 0) | (rows == num_y - 1) | (cols == 0) | (cols == num_x - 1)
+    starts = placed_outlines(tile_outline, offsets[near], None if angles is None else angles[near])
+    ends = np.roll(starts, -1, axis=1)
+    starts, ends = starts.reshape(-1, 2), ends.reshape(-1, 2)
+    owners = np.repeat(edge[near], len(tile_outline))
+
+    # Une arête partagée apparaît dans les deux sens : on la compte sans orientation
+    forward = (starts[:, 0] < ends[:, 0]) | ((starts[:, 0] == ends[:, 0]) & (starts[:, 1] < ends[:, 1]))
+    keys = np.round(np.where(forward[:, None], np.hstack((starts, ends)), np.hstack((ends, starts))), 6)
+    _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    outside = owners & (counts[inverse.ravel()] == 1)
+    starts, ends = starts[outside], ends[outside]
+
+    count = len(starts)
+    vertices = np.vstack((np.column_stack((starts, np.full(count, -thickness))),
+                          np.column_stack((ends, np.full(count, -thickness))),
+                          np.column_stack((ends, np.zeros(count))),
+                          np.column_stack((starts, np.zeros(count)))))
+    quad = np.arange(count)
+    faces = np.vstack((np.column_stack((quad, count + quad, 2 * count + quad)),
+                       np.column_stack((quad, 2 * count + quad, 3 * count + quad))))
+
+    underside = plate_underside(starts, ends)
+    if underside is None:
+        # Contour qui se touche en un point : dessous de chaque tuile, en éventail
+        tiles = placed_outlines(tile_outline, offsets, angles)
+        inner = np.arange(1, tiles.shape[1] - 1)
+        bottom = np.column_stack((np.zeros_like(inner), inner + 1, inner))
+        underside = (bottom[None] + len(vertices) + tiles.shape[1] * np.arange(len(tiles))[:, None, None]).reshape(-1, 3)
+        vertices = np.vstack((vertices, np.column_stack((tiles.reshape(-1, 2), np.full(tiles.size // 2, -thickness)))))
+    return vertices, np.vstack((faces, underside))
+
+def plate_underside(starts, ends):
+    # Faces (T, 3) du dessous, tournées vers le bas, sur les sommets bas des murs (indices des
+    # arêtes) ; None si le contour n'est pas fait de boucles simples dans le sens direct
+    if not len(starts):
+        return np.zeros((0, 3), dtype=int)
+    points = np.round(np.vstack((starts, ends)), 6)
+    _, ids = np.unique(points, axis=0, return_inverse=True)
+    ids = ids.ravel()
+    start_ids, end_ids = ids[:len(starts)], ids[len(starts):]
+    if len(np.unique(start_ids)) != len(start_ids):
+        return None
+    edge_by_start = np.full(ids.max() + 1, -1)
+    edge_by_start[start_ids] = np.arange(len(starts))
+    successor = edge_by_start[end_ids]
+    if (successor < 0).any():
+        return None
+    faces, visited = [], np.zeros(len(starts), dtype=bool)
+    for first in range(len(starts)):
+        if visited[first]:
+            continue
+        loop = [first]
+        visited[first] = True
+        while successor[loop[-1]] != first:
+            loop.append(successor[loop[-1]])
+            visited[loop[-1]] = True
+        loop = np.array(loop)
+        if signed_area(starts[loop]) <= 0:
+            return None
+        faces.append(loop[ear_clip(starts[loop])][:, ::-1])
+    return np.vstack(faces) if faces else np.zeros((0, 3), dtype=int)
+
+@lru_cache(maxsize=32)
+def koch_level(side_length, iterations):
+    # Contour (S, 2) et triangles pleins (F, 3, 3) du flocon, centré sur l'origine.
+    # Chaque niveau est mémorisé et sert de point de départ au suivant : le flocon est
+    # le triangle initial plus, à chaque niveau, une pointe posée sur chaque segment.
+    if iterations < 0:
+        raise ValueError(f"Nombre d'itérations négatif pour le flocon de Koch : {iterations}")
+    if iterations == 0:
+        outline = triangle_outline(side_length)
+        bumps = outline[None]
+        triangles = np.zeros((0, 3, 3))
+    else:
+        previous, triangles = koch_level(side_length, iterations - 1)
+        start = previous
+        third = (np.roll(previous, -1, axis=0) - start) / 3
+        p1, p2 = start + third, start + 2 * third
+        # Pointe vers l'extérieur : le tiers de segment tourné de -60° (contour dans le sens direct)
+        cos, sin = 0.5, np.sqrt(3) / 2
+        peak = p1 + np.column_stack((cos * third[:, 0] + sin * third[:, 1], cos * third[:, 1] - sin * third[:, 0]))
+        outline = np.stack((start, p1, peak, p2), axis=1).reshape(-1, 2)
+        bumps = np.stack((p1, peak, p2), axis=1)
+
+    flat = np.concatenate((bumps, np.zeros(bumps.shape[:2] + (1,))), axis=-1)
+    triangles = np.concatenate((triangles, flat))
+    outline.flags.writeable = False
+    triangles.flags.writeable = False
+    return outline, triangles
+
+
+
+# Motifs enregistrés, par nom : l'interface, la ligne de commande et le générateur
+# en découlent. Ajouter un motif revient à déclarer une classe décorée par @register
+PATTERNS = {}
+
+def register(cls):
+    PATTERNS[cls.name] = cls
+    return cls
+
+# Un paramètre de motif : clé, libellé du formulaire, type, valeur par défaut du
+# formulaire, aide de la ligne de commande
+Parameter = namedtuple('Parameter', 'key label type default help')
+
+HEIGHT = Parameter('height', "Hauteur des cellules (mm)", float, 1.0, "Hauteur des cellules (mm)")
+SPACING = Parameter('spacing', "Espacement entre les cellules (mm)", float, 0.25, "Espacement entre les cellules (mm)")
+SIDE_LENGTH = Parameter('side_length', "Longueur du côté (mm)", float, 1.0,
+                        "Côté des carrés, des triangles ou des flocons de Koch (mm)")
+BASE = Parameter('base_thickness', "Épaisseur de la plaque de base (mm)", float, 0.0,
+                 "Plaque de base soudée sous les cellules (mm)")
+PLATE = (Parameter('width', "Largeur de la surface (mm)", float, 10.0, "Largeur de la surface (mm)"),
+         Parameter('height_dimension', "Hauteur de la surface (mm)", float, 10.0, "Hauteur de la surface (mm)"))
+
+# Paramètres sans effet sur le gabarit d'une cellule : ils n'entrent pas dans sa clé de cache
+PLACEMENT_KEYS = {'width', 'height_dimension', 'outline', 'fill', 'workers', 'band_rows'}
+TEMPLATE_CACHE_SIZE = 32
+# Gabarits (sommets, faces) déjà construits, du plus ancien au plus récent
+TEMPLATES = OrderedDict()
+
+def cached_template(key, build):
+    # Un gabarit n'est construit qu'une fois par jeu de paramètres de cellule ; les
+    # tableaux sont en lecture seule puisqu'ils sont partagés entre plaques
+    if key in TEMPLATES:
+        TEMPLATES.move_to_end(key)
+        return TEMPLATES[key]
+    with stage('template', pattern=key[0]):
+        vertices, faces = build()
+    vertices, faces = np.asarray(vertices, dtype=np.float64), np.asarray(faces)
+    vertices.flags.writeable = False
+    faces.flags.writeable = False
+    TEMPLATES[key] = (vertices, faces)
+    while len(TEMPLATES) > TEMPLATE_CACHE_SIZE:
+        TEMPLATES.popitem(last=False)
+    return vertices, faces
+
+
+class Pattern:
+    # Un motif déclare son nom, son schéma de paramètres, le contour de sa cellule,
+    # son réseau (square, hex ou triangular) et sa tuile de plaque ; le placement,
+    # la plaque de base, la découpe, le cache et l'export lui sont communs.
+    # layout() renvoie (sommets, faces, décalages, angles, cellules par ligne) d'une
+    # cellule indexée ; maillage complet, export par bandes ou forme indexée en découlent
+    name = None
+    label = None
+    filename = None
+    schema = ()
+    lattice_kind = 'square'
+    supports_base = True
 
-    def generate_mesh(self):
-        num_points = 30
-        vertices, faces = create_circle(self.parameters['radius'], self.parameters['height'], num_points)
-        mesh_data = np.zeros(len(faces), dtype=stlmesh.Mesh.dtype)
-        for i, face in enumerate(faces):
-            mesh_data['vectors'][i] = vertices[face]
-        return stlmesh.Mesh(mesh_data, remove_empty_areas=False)
-
-class Square:
     def __init__(self, parameters):
         self.parameters = parameters
+        self.placement = None
+
+    @classmethod
+    def parameter_schema(cls):
+        # Paramètres propres au motif, puis plaque de base et taille de la surface
+        return tuple(cls.schema) + ((BASE,) if cls.supports_base else ()) + PLATE
+
+    def footprint(self):
+        # Contour convexe de la cellule (P, 2) dans le sens direct, et sa hauteur
+        raise NotImplementedError
+
+    def pitch(self):
+        # Pas du réseau (x, y)
+        raise NotImplementedError
+
+    def origin(self):
+        # Décalage de la première cellule
+        return 0.0, 0.0
+
+    def tile(self):
+        # Tuile (K, 2) : la part de plaque de chaque cellule, dont les tuiles voisines
+        # partagent les arêtes ; None si le motif n'a pas de plaque de base
+        return None
+
+    def lattice(self, width=None, height=None):
+        # Décalages (N, 2), angles (N,) ou None, cellules par ligne, nombre de lignes et tuile.
+        # width et height remplacent la taille de la plaque (remplissage jusqu'au bord)
+        pitch_x, pitch_y = self.pitch()
+        width = self.parameters.get('width', pitch_x) if width is None else width
+        height = self.parameters.get('height_dimension', pitch_y) if height is None else height
+        num_x, num_y = int(width // pitch_x), int(height // pitch_y)
+        angles = None
+        if self.lattice_kind == 'hex':
+            offsets = hex_lattice(pitch_x, pitch_y, num_x, num_y) + self.origin()
+        elif self.lattice_kind == 'triangular':
+            # Un triangle couvre deux pas : un de moins par ligne
+            num_x = max(num_x - 1, 0)
+            offsets, angles = tri_lattice(pitch_x, pitch_y, num_x, num_y)
+            offsets += self.origin()
+        else:
+            offsets = rect_lattice(pitch_x, pitch_y, num_x, num_y, origin=self.origin())
+        return offsets, angles, num_x, num_y, self.tile()
+
+    def template_key(self):
+        return (self.name,) + tuple(sorted((key, value) for key, value in self.parameters.items()
+                                           if key not in PLACEMENT_KEYS))
+
+    def cell(self, tile_outline):
+        # Gabarit indexé (sommets, faces) d'une cellule, soudée à sa tuile s'il y a une plaque
+        outline, height = self.footprint()
+        if self.base_thickness():
+            return fuse(outline, height, tile_outline)
+        return extrude(outline, height)
+
+    def cell_radius(self):
+        # Rayon d'un cercle centré sur le décalage qui contient toute la cellule
+        outline, _ = self.footprint()
+        return float(np.linalg.norm(outline, axis=1).max())
+
+    def clip_region(self):
+        # Contour de découpe : 'rectangle' (la plaque), 'circle' (inscrit dans la plaque)
+        # ou chemin d'un fichier de points ; 'fill' remplit le contour jusqu'au bord
+        outline = self.parameters.get('outline')
+        if not outline and not self.parameters.get('fill'):
+            return None
+        width, height = self.parameters['width'], self.parameters['height_dimension']
+        if not outline or outline == 'rectangle':
+            return rectangle_outline(0, 0, width, height)
+        if outline == 'circle':
+            radius = min(width, height) / 2
+            return circle_outline(radius, circle_segments(float(radius))) + [width / 2, height / 2]
+        return load_outline(outline)
+
+    def clip_boundary(self, offsets, angles, region):
+        # Pièces découpées (sommets, faces) des cellules du bord, et indices de celles
+        # qui sont en fait entières
+        outline, height = self.footprint()
+        return clip_cells(outline, height, offsets, region, angles)
+
+    def cells(self):
+        # Décalages et angles retenus, et pièces découpées, calculés une fois par instance
+        if self.placement is not None:
+            return self.placement
+        region = self.clip_region()
+        if region is None:
+            self.placement = self.lattice() + (None,)
+            return self.placement
+        if self.base_thickness():
+            raise ValueError("La plaque de base n'est pas compatible avec un contour de découpe")
+
+        radius = self.cell_radius()
+        with stage('cull'):
+            if self.parameters.get('fill'):
+                # Réseau étendu à tout le contour, avec une marge d'une cellule de chaque côté
+                margin = 4 * radius + self.parameters.get('spacing', 0)
+                low, high = region.min(axis=0), region.max(axis=0)
+                offsets, angles, num_x, num_y, tile_outline = self.lattice(*(high - low + 2 * margin))
+                offsets = offsets + (low - margin)
+            else:
+                offsets, angles, num_x, num_y, tile_outline = self.lattice()
+            states = BinGrid(region, radius).classify(offsets, radius)
+        boundary = states == BOUNDARY
+        boundary_angles = None if angles is None else angles[boundary]
+        with stage('clip', cells=int(boundary.sum())):
+            vertices, faces, whole = self.clip_boundary(offsets[boundary], boundary_angles, region)
+        offsets = np.vstack((offsets[states == INSIDE], offsets[boundary][whole]))
+        if angles is not None:
+            angles = np.concatenate((angles[states == INSIDE], boundary_angles[whole]))
+        self.placement = (offsets, angles, num_x, num_y, tile_outline, (vertices, faces))
+        return self.placement
+
+    def base_thickness(self):
+        return self.parameters.get('base_thickness', 0) or 0
+
+    def layout(self):
+        thickness = self.base_thickness()
+        if thickness and not self.supports_base:
+            raise ValueError(f"Le motif {self.label} ne permet pas de plaque de base")
+        if thickness and self.parameters.get('spacing', 0) <= 0:
+            raise ValueError("La plaque de base demande un espacement strictement positif entre les cellules")
+        offsets, angles, num_x, num_y, tile_outline, _ = self.cells()
+        vertices, faces = cached_template(self.template_key(), lambda: self.cell(tile_outline))
+        return vertices, faces, offsets, angles, num_x
+
+    def describe(self):
+        # layout() mesuré : construction de la cellule et du réseau de décalages
+        with stage('layout', shape=type(self).__name__):
+            return self.layout()
+
+    def extras(self):
+        # Géométrie non répétée (sommets, faces) ajoutée après les cellules, ou None :
+        # les murs extérieurs de la plaque de base, ou les cellules découpées par le contour
+        offsets, angles, num_x, num_y, tile_outline, pieces = self.cells()
+        if pieces is not None:
+            return pieces if len(pieces[1]) else None
+        thickness = self.base_thickness()
+        if not thickness:
+            return None
+        return plate_walls(tile_outline, offsets, num_x, num_y, thickness, angles)
+
+    def extra_triangles(self):
+        extra = self.extras()
+        return None if extra is None else triangulate(*extra)
 
     def generate_mesh(self):
+        vertices, faces, offsets, angles, row_length = self.describe()
+        return tile(triangulate(vertices, faces), offsets, angles,
+                    extra=self.extra_triangles(), **tile_options(self.parameters, row_length))
+
+    def generate_bands(self, progress=None):
+        vertices, faces, offsets, angles, row_length = self.describe()
+        options = tile_options(self.parameters, row_length)
+        return bands(triangulate(vertices, faces), offsets, angles, options['band_size'], progress,
+                     self.extra_triangles(), options['workers'])
+
+    def generate_indexed(self):
+        # Sommets partagés (float32) et faces (int32) : 3 à 6 fois plus compact que les triangles
+        vertices, faces, offsets, angles, _ = self.describe()
+        vertices, faces = tile_indexed(vertices, fan(faces), offsets, angles)
+        extra = self.extras()
+        if extra is not None:
+            faces = np.concatenate((faces, fan(extra[1]).astype(np.int32) + len(vertices)))
+            vertices = np.concatenate((vertices, np.asarray(extra[0], dtype=np.float32)))
+        return vertices, faces
+
+    def triangle_count(self):
+        _, faces, offsets, _, _ = self.describe()
+        extra = self.extras()
+        return len(fan(faces)) * len(offsets) + (0 if extra is None else len(fan(extra[1])))
+
+    def save(self, filename, name=None, progress=None):
+        # Export continu : la mémoire reste bornée par une bande de lignes
+        return save_stream(filename, self.generate_bands(progress), name or type(self).__name__)
+
+    def save_ply(self, filename, name=None, progress=None):
+        vertices, faces, offsets, angles, row_length = self.describe()
+        faces = fan(faces)
+        band_size = tile_options(self.parameters, row_length)['band_size']
+        extra = self.extras()
+        if extra is not None:
+            extra = (extra[0], fan(extra[1]))
+        num_vertices = len(vertices) * len(offsets) + (0 if extra is None else len(extra[0]))
+        num_faces = len(faces) * len(offsets) + (0 if extra is None else len(extra[1]))
+        return save_ply(filename, indexed_bands(vertices, faces, offsets, angles, band_size, progress, extra),
+                        num_vertices, num_faces, name or type(self).__name__)
+
+
+@register
+class Hexagon(Pattern):
+    name, label, filename = 'hexagon', "Hexagone", "hexagon.stl"
+    lattice_kind = 'hex'
+    schema = (Parameter('size', "Taille des hexagones (mm)", float, 1.0, "Taille des hexagones (mm)"),
+              HEIGHT._replace(label="Hauteur des hexagones (mm)"),
+              SPACING._replace(label="Espacement entre les hexagones (mm)"))
+
+    def footprint(self):
+        # Pointe en haut : équivalent à l'ancienne rotation de ±30° en damier
+        return hexagon_outline(self.parameters['size']), self.parameters['height']
+
+    def pitch(self):
+        return (math.sqrt(3) * self.parameters['size'] + self.parameters['spacing'],
+                1.5 * self.parameters['size'] + self.parameters['spacing'])
+
+    def tile(self):
+        # Cellule de Voronoï du réseau en quinconce : sommets partagés par trois tuiles
+        horiz, vert = self.pitch()
+        side = (vert ** 2 - horiz ** 2 / 4) / (2 * vert)
+        apex = (vert ** 2 + horiz ** 2 / 4) / (2 * vert)
+        return np.array([[horiz / 2, -side], [horiz / 2, side], [0, apex],
+                         [-horiz / 2, side], [-horiz / 2, -side], [0, -apex]])
+
+
+@register
+class Circle(Pattern):
+    name, label, filename = 'circle', "Rond", "rond.stl"
+    schema = (Parameter('radius', "Rayon du cercle (mm)", float, 1.0, "Rayon des ronds (mm)"),
+              HEIGHT._replace(label="Hauteur des ronds (mm)"),
+              SPACING._replace(label="Espacement entre les ronds (mm)", default=1.0),
+              Parameter('tolerance', "Tolérance de corde (mm)", float, CHORD_TOLERANCE,
+                        "Écart arc-corde toléré pour les ronds (mm)"),
+              Parameter('resolution', "Résolution de l'imprimante (mm)", float, PRINTER_RESOLUTION,
+                        "Résolution de l'imprimante (mm)"))
+
+    def footprint(self):
+        # Nombre de segments calculé une fois par rayon, puis le même gabarit pour toutes les cellules
+        radius = self.parameters['radius']
+        num_points = circle_segments(float(radius), float(self.parameters.get('tolerance', CHORD_TOLERANCE)),
+                                     float(self.parameters.get('resolution', PRINTER_RESOLUTION)))
+        return circle_outline(radius, num_points), self.parameters['height']
+
+    def pitch(self):
+        pitch = 2 * self.parameters['radius'] + self.parameters.get('spacing', 0)
+        return pitch, pitch
+
+    def origin(self):
+        return self.parameters['radius'], self.parameters['radius']
+
+    def tile(self):
+        pitch, _ = self.pitch()
+        return rectangle_outline(-pitch / 2, -pitch / 2, pitch / 2, pitch / 2)
+
+
+@register
+class Square(Pattern):
+    name, label, filename = 'square', "Carré", "carre.stl"
+    schema = (SIDE_LENGTH._replace(label="Longueur du côté du carré (mm)"),
+              HEIGHT._replace(label="Hauteur du carré (mm)"),
+              SPACING._replace(label="Espacement entre les carrés (mm)"))
+
+    def footprint(self):
+        # Prisme fermé de la hauteur demandée : 6 faces, soit 12 triangles par cellule
         side_length = self.parameters['side_length']
-        height = self.parameters['height']
-        spacing = self.parameters['spacing']
-        width = self.parameters['width']
-        height_dimension = self.parameters['height_dimension']
-
-        num_x = int(width // (side_length + spacing))
-        num_y = int(height_dimension // (side_length + spacing))
-
-        vertices = []
-        faces = []
-
-        for y in range(num_y):
-            for x in range(num_x):
-                # Calculate vertex coordinates
-                x_offset = x * (side_length + spacing)
-                y_offset = y * (side_length + spacing)
-                z_offset = 0  # Assuming the square is on the XY plane
-                vertices.extend([
-                    [x_offset, y_offset, z_offset],
-                    [x_offset + side_length, y_offset, z_offset],
-                    [x_offset + side_length, y_offset + side_length, z_offset],
-                    [x_offset, y_offset + side_length, z_offset]
-                ])
-
-                # Calculate face indices
-                base_index = (y * num_x + x) * 4
-                faces.extend([
-                    [base_index, base_index + 1, base_index + 2],
-                    [base_index, base_index + 2, base_index + 3]
-                ])
-
-        # Convert vertices and faces to numpy arrays
-        vertices = np.array(vertices)
-        faces = np.array(faces)
-
-        # Create the mesh
-        mesh_data = np.zeros(len(faces), dtype=stlmesh.Mesh.dtype)
-        for i, face in enumerate(faces):
-            mesh_data['vectors'][i] = vertices[face]
-
-        return stlmesh.Mesh(mesh_data, remove_empty_areas=False)
-class KochSnowflake:
-    def __init__(self, parameters):
-        self.parameters = parameters
+        return rectangle_outline(0, 0, side_length, side_length), self.parameters['height']
 
-    def generate_mesh(self):
+    def pitch(self):
+        pitch = self.parameters['side_length'] + self.parameters['spacing']
+        return pitch, pitch
+
+    def tile(self):
+        pitch, _ = self.pitch()
+        middle = self.parameters['side_length'] / 2
+        return rectangle_outline(middle - pitch / 2, middle - pitch / 2, middle + pitch / 2, middle + pitch / 2)
+
+
+@register
+class Triangle(Pattern):
+    # Triangles équilatéraux alternés pointe en haut / pointe en bas (rotation de π)
+    name, label, filename = 'triangle', "Triangle", "triangle.stl"
+    lattice_kind = 'triangular'
+    schema = (SIDE_LENGTH._replace(label="Longueur du côté du triangle (mm)"),
+              HEIGHT._replace(label="Hauteur des triangles (mm)"),
+              SPACING._replace(label="Espacement entre les triangles (mm)"))
+
+    def footprint(self):
+        return triangle_outline(self.parameters['side_length']), self.parameters['height']
+
+    def tile_side(self):
+        # Triangle agrandi de l'espacement : ses côtés sont à spacing / 2 de ceux de la cellule
+        return self.parameters['side_length'] + math.sqrt(3) * self.parameters.get('spacing', 0)
+
+    def pitch(self):
+        side = self.tile_side()
+        return side / 2, side * math.sqrt(3) / 2
+
+    def origin(self):
+        return self.tile_side() / 2, 0.0
+
+    def tile(self):
+        return triangle_outline(self.tile_side())
+
+    def layout(self):
+        # Sur une seule colonne, deux lignes voisines ne se touchent que par une pointe :
+        # la plaque n'est pas d'un seul tenant et ses murs se croisent en ce point
+        vertices, faces, offsets, angles, num_x = super().layout()
+        if self.base_thickness() and num_x == 1 and len(offsets) > 1:
+            raise ValueError("Une seule colonne de triangles : élargir la surface pour une plaque de base")
+        return vertices, faces, offsets, angles, num_x
+
+
+@register
+class KochSnowflake(Pattern):
+    name, label, filename = 'koch', "Flocon de Koch", "koch_snowflake.stl"
+    schema = (SIDE_LENGTH._replace(label="Longueur du côté du triangle (mm)"),
+              Parameter('iterations', "Nombre d'itérations", int, 3, "Nombre d'itérations du flocon de Koch"))
+    # Le flocon est plat : pas de plaque de base possible
+    supports_base = False
+
+    def cell(self, tile_outline):
+        _, triangles = koch_level(float(self.parameters['side_length']), int(self.parameters['iterations']))
+        return index(triangles)
+
+    def cell_radius(self):
+        return self.parameters['side_length'] / np.sqrt(3)
+
+    def clip_boundary(self, offsets, angles, region):
+        # Le flocon est plat et non convexe : on ne le découpe pas. Un flocon du bord est
+        # gardé si son enveloppe (les pointes, toutes à la distance maximale) est dedans
+        outline, _ = koch_level(float(self.parameters['side_length']), int(self.parameters['iterations']))
+        distances = np.linalg.norm(outline, axis=1)
+        hull = outline[distances >= distances.max() - 1e-9]
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=int), contained(hull, offsets, region)
+
+    def pitch(self):
+        # Chaque flocon occupe une région de la surface
         side_length = self.parameters['side_length']
-        iterations = self.parameters['iterations']
-
-        # Coordonnées des sommets du triangle équilatéral initial
-        vertices = np.array([
-            [0, np.sqrt(3) * side_length / 3, 0],   # Sommet inférieur
-            [-side_length / 2, 0, 0],                # Sommet inférieur gauche
-            [side_length / 2, 0, 0]                  # Sommet inférieur droit
-        ])
-
-        # Génère le flocon de Koch itérativement
-        for _ in range(iterations):
-            new_vertices = []
-            for i in range(len(vertices)):
-                # Points de départ et d'arrivée du segment actuel
-                start_point = vertices[i]
-                end_point = vertices[(i + 1) % len(vertices)]
-
-                # Calcule les deux tiers du segment
-                p1 = start_point + (end_point - start_point) / 3
-                p2 = start_point + 2 * (end_point - start_point) / 3
-
-                # Calcule les coordonnées des sommets des triangles équilatéraux sortants
-                outward_point1 = p1 + np.dot(p2 - p1, np.array([[0, -1], [1, 0]])) / np.sqrt(3)
-                outward_point2 = p2 + np.dot(p1 - p2, np.array([[0, 1], [-1, 0]])) / np.sqrt(3)
-
-                # Construit les nouveaux segments du flocon
-                new_vertices.extend([start_point, p1, outward_point1])
-                new_vertices.extend([outward_point1, p2, outward_point2])
-                new_vertices.extend([outward_point2, end_point, start_point])
-
-            vertices = np.array(new_vertices)
-
-        # Construction des faces du flocon
-        faces = []
-        for i in range(0, len(vertices) - 2, 3):
-            faces.append([i, i + 1, i + 2])
-
-        # Création du maillage STL
-        mesh_data = np.zeros(len(faces), dtype=stlmesh.Mesh.dtype)
-        for i, face in enumerate(faces):
-            mesh_data['vectors'][i] = vertices[face]
-
-        return stlmesh.Mesh(mesh_data, remove_empty_areas=False)
+        return side_length * 3, side_length * np.sqrt(3)
+
+    def origin(self):
+        # Le flocon est centré sur l'origine : on le place au centre de sa région
+        region_width, region_height = self.pitch()
+        return region_width / 2, region_height / 2
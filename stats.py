@@ -0,0 +1,106 @@
+# Statistiques d'un STL binaire existant : le fichier est projeté en mémoire et
+# parcouru par blocs, donc la mémoire utilisée ne dépend pas de sa taille
+
+import argparse
+import json
+import sys
+import numpy as np
+from export import map_chunks, split, stl_layout
+from tiling import STREAM_BAND_TRIANGLES
+from profiling import stage
+
+# Aire en dessous de laquelle un triangle est considéré comme dégénéré (mm²)
+DEGENERATE_AREA = 1e-12
+
+
+def row_cross(b, c):
+    # Produits vectoriels ligne par ligne de deux tableaux (N, 3), colonne par colonne :
+    # bien plus rapide que np.cross sur de grands tableaux
+    return np.column_stack((b[:, 1] * c[:, 2] - b[:, 2] * c[:, 1],
+                            b[:, 2] * c[:, 0] - b[:, 0] * c[:, 2],
+                            b[:, 0] * c[:, 1] - b[:, 1] * c[:, 0]))
+
+
+def mesh_stats(chunks):
+    # Nombre de triangles, boîte englobante, aire, volume (signé, positif si les
+    # normales pointent vers l'extérieur) et triangles dégénérés ou non finis,
+    # accumulés bloc par bloc (tableaux Mesh.dtype)
+    low = np.full(3, np.inf)
+    high = np.full(3, -np.inf)
+    area = volume = 0.0
+    count = degenerate = 0
+    for data in chunks:
+        count += len(data)
+        with stage('stats', triangles=len(data)):
+            triangles = np.asarray(data['vectors'], dtype=np.float64)
+            a, b, c = triangles[:, 0], triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]
+            cross = row_cross(b, c)
+            areas = 0.5 * np.sqrt(np.einsum('ij,ij->i', cross, cross))
+            # Un sommet infini ou NaN rend l'aire non finie : ces triangles sont écartés
+            finite = np.isfinite(areas)
+            if not finite.all():
+                degenerate += int((~finite).sum())
+                triangles, a, cross, areas = triangles[finite], a[finite], cross[finite], areas[finite]
+            if not len(triangles):
+                continue
+            # Réduction colonne par colonne : bien plus rapide que min(axis=0) sur (N, 3)
+            points = triangles.reshape(-1, 3)
+            low = np.minimum(low, [points[:, axis].min() for axis in range(3)])
+            high = np.maximum(high, [points[:, axis].max() for axis in range(3)])
+            degenerate += int((areas <= DEGENERATE_AREA).sum())
+            area += float(areas.sum())
+            volume += float(np.einsum('ij,ij->', a, cross)) / 6
+    empty = not np.isfinite(low).all()
+    return {
+        'triangles': count,
+        'bounds': None if empty else [low.tolist(), high.tolist()],
+        'size': None if empty else (high - low).tolist(),
+        'area': area,
+        'volume': volume,
+        'degenerate': degenerate
+    }
+
+
+def array_stats(data, chunk=STREAM_BAND_TRIANGLES):
+    return mesh_stats(split(data, chunk))
+
+
+def file_stats(filename, chunk=STREAM_BAND_TRIANGLES):
+    name, _, _ = stl_layout(filename)
+    return {'file': filename, 'name': name, **mesh_stats(map_chunks(filename, chunk))}
+
+
+def format_stats(stats):
+    lines = [f"{stats['file']} ({stats['name']})", f"  triangles   : {stats['triangles']}"]
+    if stats['bounds'] is not None:
+        low, high = stats['bounds']
+        lines.append("  boîte       : " + " ".join(f"{value:.4g}" for value in low) +
+                     " -> " + " ".join(f"{value:.4g}" for value in high))
+        lines.append("  dimensions  : " + " x ".join(f"{value:.4g}" for value in stats['size']) + " mm")
+    lines.append(f"  aire        : {stats['area']:.6g} mm²")
+    lines.append(f"  volume      : {stats['volume']:.6g} mm³")
+    lines.append(f"  dégénérés   : {stats['degenerate']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Affiche les statistiques de fichiers STL binaires existants.")
+    parser.add_argument('files', nargs='+', help="Fichiers STL binaires")
+    parser.add_argument('--chunk', type=int, default=STREAM_BAND_TRIANGLES, help="Triangles lus par bloc")
+    parser.add_argument('--json', action='store_true', help="Sortie JSON, une ligne par fichier")
+    args = parser.parse_args(argv)
+
+    status = 0
+    for filename in args.files:
+        try:
+            stats = file_stats(filename, args.chunk)
+        except (OSError, ValueError) as error:
+            print(error, file=sys.stderr)
+            status = 1
+            continue
+        print(json.dumps(stats) if args.json else format_stats(stats))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
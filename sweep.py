@@ -0,0 +1,117 @@
+# Balayage de paramètres : chaque jeu de paramètres est un travail complet,
+# exécuté sur son propre processus
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import cpu_count
+from generator import save, filename_for, header_for
+from export import stl_layout
+
+
+def parse_value(text):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def expand(entry):
+    # Une valeur de type liste se développe en produit cartésien :
+    # {"size": [1, 2], "spacing": [0.25, 0.5]} donne quatre travaux
+    keys = list(entry)
+    values = [value if isinstance(value, list) else [value] for value in entry.values()]
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+
+def load_jobs(filename):
+    # Liste JSON d'objets, ou CSV avec une colonne par paramètre ; 'shape' est obligatoire
+    if filename.lower().endswith('.csv'):
+        with open(filename, newline='') as fh:
+            entries = [{key: parse_value(value) for key, value in row.items() if value != ''}
+                       for row in csv.DictReader(fh)]
+    else:
+        with open(filename) as fh:
+            entries = json.load(fh)
+        if isinstance(entries, dict):
+            entries = [entries]
+    return [job for entry in entries for job in expand(entry)]
+
+
+def up_to_date(filename, shape, params):
+    # Même en-tête et fichier complet : save_stream écrit l'en-tête d'abord et ne corrige le
+    # nombre de triangles qu'à la fin, donc un travail interrompu laisse le bon en-tête
+    # avec un nombre nul ou une taille incohérente
+    try:
+        name, count, _ = stl_layout(filename)
+    except (OSError, ValueError):
+        return False
+    return count > 0 and name == header_for(shape, params)
+
+
+def run_job(job, output_dir, force=False):
+    params = dict(job)
+    shape = params.pop('shape')
+    # Un travail par processus : pas de parallélisme imbriqué sauf demande explicite
+    params.setdefault('workers', 1)
+    filename = os.path.join(output_dir, filename_for(shape, params))
+    if not force and up_to_date(filename, shape, params):
+        return {'file': filename, 'skipped': True, 'triangles': None, 'seconds': 0.0, 'error': None}
+
+    start = time.perf_counter()
+    count = save(shape, params, filename)
+    return {'file': filename, 'skipped': False, 'triangles': count, 'seconds': time.perf_counter() - start,
+            'error': None}
+
+
+def run_sweep(jobs, output_dir='.', workers=None, force=False, report=print):
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers or cpu_count()) as executor:
+        futures = [executor.submit(run_job, job, output_dir, force) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                # Un jeu de paramètres invalide n'arrête pas les autres travaux
+                message = f"{type(error).__name__} : {error}"
+                result = {'file': None, 'skipped': False, 'triangles': None, 'seconds': 0.0, 'error': message}
+                if report:
+                    report(f"{json.dumps(job)} : échec, {message}")
+                results.append(result)
+                continue
+            if report:
+                if result['skipped']:
+                    report(f"{result['file']} : inchangé, ignoré")
+                else:
+                    report(f"{result['file']} : {result['triangles']} triangles en {result['seconds']:.2f} s")
+            results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génère une série de plaques STL à partir d'une liste de paramètres.")
+    parser.add_argument('jobs', help="Fichier JSON ou CSV des jeux de paramètres")
+    parser.add_argument('--output-dir', '-o', default='.', help="Dossier des fichiers STL")
+    parser.add_argument('--workers', type=int, help="Nombre de travaux simultanés")
+    parser.add_argument('--force', action='store_true', help="Régénère même les fichiers à jour")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = run_sweep(load_jobs(args.jobs), args.output_dir, args.workers, args.force)
+    failed = sum(result['error'] is not None for result in results)
+    skipped = sum(result['skipped'] for result in results)
+    print(f"{len(results) - failed - skipped} générés, {skipped} ignorés, {failed} en échec "
+          f"en {time.perf_counter() - start:.2f} s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
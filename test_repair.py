@@ -0,0 +1,94 @@
+# Chaque motif enregistré doit sortir étanche de la réparation, sans perdre de triangle :
+# seul, avec plaque de base et découpé dans un contour (la plaque de base n'accepte pas de contour)
+
+import json
+import numpy as np
+import pytest
+from generator import SHAPES, parameters_for
+from repair import repair
+
+VARIANTS = {
+    'seul': {},
+    'plaque': {'base_thickness': 1.0},
+    'découpé': {'outline': 'circle'},
+    'rempli': {'outline': 'circle', 'fill': True},
+    'concave': {'outline': 'concave.json'},
+    'concave rempli': {'outline': 'concave.json', 'fill': True},
+}
+# Contour en U (écrit dans concave.json) : la fente étroite coupe des cellules en deux pièces
+CONCAVE = [[0, 0], [12, 0], [12, 12], [6.5, 12], [6.5, 2], [5.5, 2], [5.5, 12], [0, 12]]
+# Tolérance de soudure : seuls les sommets identiques au bit près sont fusionnés
+TOLERANCE = 1e-9
+
+
+def cases():
+    return [pytest.param(shape, extra, id=f"{shape}-{name}")
+            for shape, pattern in SHAPES.items() for name, extra in VARIANTS.items()
+            if pattern.supports_base or 'base_thickness' not in extra]
+
+
+def inside(polygon, points):
+    # Parité des croisements d'une demi-droite horizontale avec les arêtes
+    starts, ends = polygon, np.roll(polygon, -1, axis=0)
+    x, y = points[:, None, 0], points[:, None, 1]
+    crosses = (starts[:, 1] > y) != (ends[:, 1] > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        at = starts[:, 0] + (y - starts[:, 1]) * (ends[:, 0] - starts[:, 0]) / (ends[:, 1] - starts[:, 1])
+    return (crosses & (x < at)).sum(axis=1) % 2 == 1
+
+
+@pytest.mark.parametrize('shape, extra', cases())
+def test_repair(shape, extra, tmp_path):
+    params = {param.key: param.default for param in SHAPES[shape].parameter_schema()}
+    params.update(extra, width=12.0, height_dimension=12.0)
+    concave = params.get('outline') == 'concave.json'
+    if concave:
+        params['outline'] = str(tmp_path / 'concave.json')
+        (tmp_path / 'concave.json').write_text(json.dumps(CONCAVE))
+    pattern = SHAPES[shape](parameters_for(shape, params))
+    data = pattern.generate_mesh().data
+    assert len(data) == pattern.triangle_count()
+    if concave:
+        # Aucun dessus de cellule dans la fente, hors du contour (les murs sont posés dessus)
+        triangles = data['vectors'].astype(np.float64)
+        tops = triangles[(triangles[:, :, 2] > 0).all(axis=1) & (np.ptp(triangles[:, :, 2], axis=1) == 0)]
+        assert inside(np.array(CONCAVE, dtype=float), tops.mean(axis=1)[:, :2]).all()
+
+    vertices, faces, report = repair(data['vectors'], TOLERANCE)
+    assert report['output_triangles'] == len(data)
+    assert report['degenerate_removed'] == 0
+    assert report['duplicates_removed'] == 0
+    assert report['flipped'] == 0
+    if SHAPES[shape].supports_base:
+        assert report['watertight']
+    else:
+        # Le flocon de Koch est plat : un bord, mais une orientation cohérente
+        assert report['non_manifold_edges'] == 0
+        assert report['inconsistent_edges'] == 0
+
+
+def test_repair_orientation():
+    # Faces retournées au hasard et composante entière tournée vers l'intérieur
+    params = {param.key: param.default for param in SHAPES['hexagon'].parameter_schema()}
+    data = SHAPES['hexagon'](parameters_for('hexagon', params)).generate_mesh().data
+    triangles = data['vectors'].copy()
+    turned = np.random.default_rng(0).random(len(triangles)) < 0.3
+    triangles[turned] = triangles[turned][:, ::-1]
+    triangles[:len(triangles) // 2] = triangles[:len(triangles) // 2][:, ::-1]
+
+    vertices, faces, report = repair(triangles, TOLERANCE)
+    assert report['inconsistent_edges'] > 0
+    assert report['watertight']
+    # Face par face, même sens que la plaque générée
+    repaired = vertices[faces]
+    original = data['vectors'].astype(np.float64)
+    normals = np.cross(repaired[:, 1] - repaired[:, 0], repaired[:, 2] - repaired[:, 0])
+    expected = np.cross(original[:, 1] - original[:, 0], original[:, 2] - original[:, 0])
+    assert (np.einsum('ij,ij->i', normals, expected) > 0).all()
+
+
+def test_repair_empty():
+    # Plaque plus petite qu'une cellule : aucun triangle
+    vertices, faces, report = repair(np.zeros((0, 3, 3), dtype=np.float32), TOLERANCE)
+    assert len(faces) == 0
+    assert report['output_triangles'] == 0
@@ -0,0 +1,271 @@
+import math
+import weakref
+from collections import deque
+import numpy as np
+from stl import mesh as stlmesh
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import cpu_count, shared_memory
+from profiling import stage
+
+# En dessous de ce nombre de triangles, lancer des processus coûte plus que la géométrie
+SERIAL_THRESHOLD = 2_000_000
+# Taille par défaut d'une bande en export continu (environ 50 Mo par bande)
+STREAM_BAND_TRIANGLES = 1_000_000
+
+
+def fan(faces):
+    # Découpe des faces indexées (triangles ou polygones convexes) en triangles d'indices (F, 3)
+    faces = np.asarray(faces)
+    k = faces.shape[1]
+    fan = np.stack((np.repeat(faces[:, :1], k - 2, axis=1), faces[:, 1:-1], faces[:, 2:]), axis=-1)
+    return fan.reshape(-1, 3)
+
+
+def triangulate(vertices, faces):
+    # Convertit des faces indexées en un tableau de triangles (F, 3, 3)
+    vertices = np.asarray(vertices, dtype=np.float64)
+    return vertices[fan(faces)]
+
+
+def index(triangles, decimals=6):
+    # Fusionne les sommets identiques d'un tableau de triangles (F, 3, 3) en (sommets, faces)
+    points = np.round(np.asarray(triangles, dtype=np.float64).reshape(-1, 3), decimals)
+    vertices, inverse = np.unique(points, axis=0, return_inverse=True)
+    return vertices, inverse.reshape(-1, 3)
+
+
+def rect_lattice(pitch_x, pitch_y, num_x, num_y, origin=(0.0, 0.0)):
+    # Décalages (N, 2) d'une grille rectangulaire, ligne par ligne
+    xs = origin[0] + np.arange(int(num_x)) * pitch_x
+    ys = origin[1] + np.arange(int(num_y)) * pitch_y
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    return np.column_stack((grid_x.ravel(), grid_y.ravel()))
+
+
+def hex_lattice(horiz, vert, num_x, num_y):
+    # Grille en quinconce : les lignes impaires sont décalées d'un demi-pas
+    offsets = rect_lattice(horiz, vert, num_x, num_y)
+    rows = np.repeat(np.arange(int(num_y)), int(num_x))
+    offsets[:, 0] += (rows % 2) * (horiz / 2)
+    return offsets
+
+
+def tri_lattice(pitch_x, pitch_y, num_x, num_y):
+    # Triangles alternés dans chaque ligne : centres de gravité (N, 2) et angles (N,),
+    # 0 pour un triangle pointe en haut, π pour un triangle pointe en bas
+    offsets = rect_lattice(pitch_x, pitch_y, num_x, num_y)
+    rows, cols = np.divmod(np.arange(len(offsets)), max(int(num_x), 1))
+    down = (rows + cols) % 2 == 1
+    offsets[:, 1] += np.where(down, 2 * pitch_y / 3, pitch_y / 3)
+    return offsets, np.where(down, np.pi, 0.0)
+
+
+def prepare(template, offsets, angles=None):
+    # Gabarit et décalages restent en float64 : voir place()
+    template = np.asarray(template, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.float64).reshape(-1, 2)
+    if angles is not None:
+        angles = np.asarray(angles, dtype=np.float64).ravel()
+    return template, offsets, angles
+
+
+def place(out, points, offsets, angles=None):
+    # Copie les points (..., 3) dans out (N, ..., 3) pour chaque cellule, tournés puis décalés.
+    # La somme est faite en float64 et arrondie une seule fois en float32 : un sommet partagé
+    # par deux cellules voisines (gabarit et décalage différents) donne alors exactement le
+    # même float32, sinon la plaque n'est plus fermée dès quelques centaines de millimètres
+    shape = (-1,) + (1,) * (points.ndim - 1)
+    offsets = offsets.reshape(shape + (2,))
+    if angles is None:
+        np.add(points[..., :2], offsets, out=out[..., :2], casting='same_kind')
+        out[..., 2] = points[..., 2]
+    else:
+        angles = np.asarray(angles, dtype=np.float64).reshape(shape)
+        cos, sin = np.cos(angles), np.sin(angles)
+        out[..., 0] = cos * points[..., 0] - sin * points[..., 1] + offsets[..., 0]
+        out[..., 1] = sin * points[..., 0] + cos * points[..., 1] + offsets[..., 1]
+        out[..., 2] = points[..., 2]
+
+
+def fill(data, template, offsets, angles=None):
+    # Écrit les cellules et leurs normales dans un tampon de type Mesh.dtype déjà alloué
+    num_cells, num_faces = len(offsets), len(template)
+    with stage('place', triangles=len(data)):
+        place(data['vectors'].reshape(num_cells, num_faces, 3, 3), template, offsets, angles)
+
+    normals(data)
+
+
+def normals(data):
+    # Normales (non normalisées, comme numpy-stl) recalculées depuis les sommets
+    with stage('normals', triangles=len(data)):
+        triangles = data['vectors']
+        data['normals'] = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+
+
+def band_worker(params):
+    shm_name, total, template, offsets, angles, start = params
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        data = np.ndarray((total,), dtype=stlmesh.Mesh.dtype, buffer=shm.buf)
+        stop = start + len(offsets) * len(template)
+        fill(data[start:stop], template, offsets, angles)
+        del data
+    finally:
+        shm.close()
+    return start
+
+
+def release(shm):
+    # Appelé quand le dernier tableau adossé au segment disparaît
+    shm.close()
+    shm.unlink()
+
+
+def tile_parallel(template, offsets, angles, workers, band_size, reserve=0):
+    # reserve : triangles supplémentaires laissés à zéro en fin de tampon.
+    # Le tableau renvoyé est le segment partagé lui-même, sans copie : le segment
+    # vit aussi longtemps que le tableau (et ses vues), puis il est libéré
+    num_faces = len(template)
+    total = len(offsets) * num_faces + reserve
+    shm = shared_memory.SharedMemory(create=True, size=max(total, 1) * stlmesh.Mesh.dtype.itemsize)
+    try:
+        tasks = []
+        for first in range(0, len(offsets), band_size):
+            band = slice(first, first + band_size)
+            tasks.append((shm.name, total, template, offsets[band],
+                          None if angles is None else angles[band], first * num_faces))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(band_worker, tasks))
+    except BaseException:
+        release(shm)
+        raise
+    data = np.ndarray((total,), dtype=stlmesh.Mesh.dtype, buffer=shm.buf)
+    weakref.finalize(data, release, shm)
+    return data
+
+
+def tile(template, offsets, angles=None, workers=None, band_size=None, extra=None):
+    # Tamponne le gabarit (F, 3, 3) à chaque décalage (N, 2), avec une rotation
+    # optionnelle autour de z (N,) en radians, dans un seul tampon préalloué.
+    # Les grands plateaux sont découpés en bandes de band_size cellules réparties
+    # sur workers processus ; workers=1 force le chemin série.
+    # extra (E, 3, 3) : triangles non répétés (plaque de base...) ajoutés à la fin
+    template, offsets, angles = prepare(template, offsets, angles)
+    cells = len(offsets) * len(template)
+    reserve = 0 if extra is None else len(extra)
+    total = cells + reserve
+
+    workers = workers or cpu_count()
+    if workers > 1 and total >= SERIAL_THRESHOLD:
+        band_size = band_size or math.ceil(len(offsets) / workers)
+        with stage('parallel', triangles=total, bytes=total * stlmesh.Mesh.dtype.itemsize, workers=workers):
+            data = tile_parallel(template, offsets, angles, workers, band_size, reserve)
+    else:
+        with stage('allocate', bytes=total * stlmesh.Mesh.dtype.itemsize):
+            data = np.zeros(total, dtype=stlmesh.Mesh.dtype)
+        fill(data[:cells], template, offsets, angles)
+    if reserve:
+        fill(data[cells:], np.asarray(extra, dtype=np.float64), np.zeros((1, 2)))
+
+    return stlmesh.Mesh(data, calculate_normals=False, remove_empty_areas=False)
+
+
+def band_cells(template, offsets, angles):
+    # Une bande de cellules remplie dans un processus du pool, renvoyée à l'appelant
+    data = np.zeros(len(offsets) * len(template), dtype=stlmesh.Mesh.dtype)
+    fill(data, template, offsets, angles)
+    return data
+
+
+def serial_bands(template, offsets, angles, band_size):
+    for first in range(0, len(offsets), band_size):
+        band = slice(first, first + band_size)
+        count = len(offsets[band]) * len(template)
+        with stage('allocate', bytes=count * stlmesh.Mesh.dtype.itemsize):
+            data = np.zeros(count, dtype=stlmesh.Mesh.dtype)
+        fill(data, template, offsets[band], None if angles is None else angles[band])
+        yield first, data
+
+
+def pool_bands(template, offsets, angles, band_size, workers):
+    # Bandes calculées par un pool, rendues dans l'ordre. Seules workers bandes sont
+    # en vol à la fois : la mémoire reste bornée par workers bandes, pas par le plateau
+    pending = deque()
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for first in range(0, len(offsets), band_size):
+            band = slice(first, first + band_size)
+            pending.append((first, executor.submit(band_cells, template, offsets[band],
+                                                   None if angles is None else angles[band])))
+            if len(pending) >= workers:
+                done, future = pending.popleft()
+                yield done, future.result()
+        while pending:
+            done, future = pending.popleft()
+            yield done, future.result()
+    finally:
+        # Consommateur interrompu (annulation) : les bandes pas encore commencées sont abandonnées
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def bands(template, offsets, angles=None, band_size=None, progress=None, extra=None, workers=None):
+    # Produit le plateau bande par bande (tableaux de type Mesh.dtype) sans jamais
+    # allouer le plateau entier : la mémoire reste bornée par une bande, ou par
+    # workers bandes quand les grands plateaux sont calculés sur plusieurs processus.
+    # progress(cellules faites, cellules totales) est appelé après chaque bande consommée
+    template, offsets, angles = prepare(template, offsets, angles)
+    band_size = band_size or max(1, STREAM_BAND_TRIANGLES // len(template))
+    workers = workers or cpu_count()
+    if workers > 1 and len(offsets) * len(template) >= SERIAL_THRESHOLD and len(offsets) > band_size:
+        produced = pool_bands(template, offsets, angles, band_size, workers)
+    else:
+        produced = serial_bands(template, offsets, angles, band_size)
+    for first, data in produced:
+        yield data
+        if progress:
+            progress(min(first + band_size, len(offsets)), len(offsets))
+    if extra is not None and len(extra):
+        data = np.zeros(len(extra), dtype=stlmesh.Mesh.dtype)
+        fill(data, np.asarray(extra, dtype=np.float64), np.zeros((1, 2)))
+        yield data
+
+
+def tile_indexed(vertices, faces, offsets, angles=None, first=0):
+    # Version indexée de tile : les sommets (N * V, 3) en float32 sont partagés entre
+    # faces, et les faces (N * F, 3) en int32 sont décalées de V par cellule ;
+    # first est le numéro de la première cellule, pour produire le plateau par bandes
+    vertices, offsets, angles = prepare(vertices, offsets, angles)
+    faces = np.asarray(faces, dtype=np.int32)
+    num_cells, num_vertices = len(offsets), len(vertices)
+
+    with stage('place', triangles=num_cells * len(faces), bytes=num_cells * (num_vertices * 12 + len(faces) * 12)):
+        points = np.empty((num_cells, num_vertices, 3), dtype=np.float32)
+        place(points, vertices, offsets, angles)
+        bases = (first + np.arange(num_cells, dtype=np.int32)) * num_vertices
+        return points.reshape(-1, 3), (faces[None] + bases[:, None, None]).reshape(-1, 3)
+
+
+def indexed_bands(vertices, faces, offsets, angles=None, band_size=None, progress=None, extra=None):
+    # Produit le plateau indexé bande par bande : (sommets, faces) numérotés globalement ;
+    # extra (sommets, faces) non répétés forment une dernière bande
+    vertices, offsets, angles = prepare(vertices, offsets, angles)
+    band_size = band_size or max(1, STREAM_BAND_TRIANGLES // len(faces))
+    for first in range(0, len(offsets), band_size):
+        band = slice(first, first + band_size)
+        yield tile_indexed(vertices, faces, offsets[band], None if angles is None else angles[band], first)
+        if progress:
+            progress(min(first + band_size, len(offsets)), len(offsets))
+    if extra is not None and len(extra[1]):
+        extra_vertices, extra_faces = extra
+        yield (np.asarray(extra_vertices, dtype=np.float32),
+               np.asarray(extra_faces, dtype=np.int32) + len(offsets) * len(vertices))
+
+
+def tile_options(parameters, row_length):
+    # Options de parallélisme optionnelles : 'workers' et 'band_rows' (lignes par bande)
+    band_rows = parameters.get('band_rows')
+    return {
+        'workers': parameters.get('workers'),
+        'band_size': band_rows * row_length if band_rows else None
+    }